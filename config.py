@@ -4,7 +4,7 @@ import os
 
 class Config:
     
-    def __init__(self, distro, locations_file, rules_directory, scope='', reports_path = Constants.PATH.DEFAULT_REPORTS_PATH, use_journal = True):
+    def __init__(self, distro, locations_file, rules_directory, scope='', reports_path = Constants.PATH.DEFAULT_REPORTS_PATH, use_journal = True, state_path = Constants.PATH.DEFAULT_STATE_PATH, full_scan = False, use_cache = True, paranoid = False):
         self.distro = distro
         self.locations_file = locations_file
         self._load_locations()
@@ -21,6 +21,13 @@ class Config:
                 self.scope.append(int(item))
         self.reports_path = reports_path
         self.use_journal = use_journal
+        # Where the data kept between runs is stored, and whether it must be ignored to analyze the logs from the beginning
+        self.state_path = state_path
+        self.full_scan = full_scan
+        # Whether the cached results of the commands can be reused
+        self.use_cache = use_cache
+        # Whether a sample of the cached file digests is computed again on every run
+        self.paranoid = paranoid
     
     def _load_locations(self):
         self.locations_config = configparser.ConfigParser()
@@ -28,6 +35,13 @@ class Config:
 
     def get_value(self, section, key):
         return self.locations_config.get(section, key, fallback=None)
+
+    # Values such as strptime formats contain % characters that must not be interpolated
+    def get_raw_value(self, section, key):
+        return self.locations_config.get(section, key, raw=True, fallback=None)
+
+    def get_boolean(self, section, key):
+        return self.locations_config.getboolean(section, key, fallback=False)
     
     def get_custom_definitions(self):
         if self.custom_definitions is None:
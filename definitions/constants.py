@@ -3,7 +3,7 @@ class Constants:
         class ERROR:
             CONNECTION_ERROR = 'CONNECTION_ERROR'
 
-        DATABASE_ENTRY = ['md5', 'perms', 'path', 'owner', 'group', 'acl', 'cmd']
+        DATABASE_ENTRY = ['md5', 'sha256', 'blake2b', 'perms', 'path', 'dir', 'recursive', 'hashset', 'algorithm', 'owner', 'group', 'acl', 'cmd']
 
         class SCOPE:
             LOG = 1
@@ -40,7 +40,11 @@ class Constants:
             GENERIC_RULES_PATH = 'definitions/rules/generic'
             REMOTES_PATH = 'definitions/remotes.ini'
             DEFAULT_REPORTS_PATH = '/tmp'
+            DEFAULT_STATE_PATH = '/var/lib/systell'
             DEFAULT_CONF_PATH = 'definitions/'
+            DPKG_INFO_PATH = '/var/lib/dpkg/info'
+            DPKG_STATUS_PATH = '/var/lib/dpkg/status'
+            PACMAN_LOCAL_PATH = '/var/lib/pacman/local'
 
             class DATABASE:
                 FILESYSTEM = 'definitions/databases/filesystem.list'
@@ -50,18 +54,21 @@ class Constants:
             TYPE_LINE = 'LINE'
             TYPE_BLOCK = 'BLOCK'
 
+        class VERIFIER:
+            DPKG = 'dpkg'
+            PACMAN = 'pacman'
+
         class GENERIC:
             JOURNAL = 'journal'
         
         class COMMAND:
-            SYSTEMD_UNITS = 'sudo systemctl list-unit-files --type=service'
-            SYSTEMD_FAILED = 'systemctl list-units --type=service --state=failed'
+            SYSTEMD_FAILED = 'systemctl list-units --type=service --state=failed --plain --no-legend --no-pager'
             SYSTEMD_VERIFY = 'sudo systemd-analyze verify'
             SYSTEMD_SECURITY = 'sudo systemd-analyze security'
 
         class REGEX:
-            SYSTEMD_UNITS_STATUS = '^(?P<UnitFile>.*?)[ ]+(?P<State>\w+)[ ]+(?P<Preset>[a-z-]+)'
-            SYSTEMD_FAILED_UNITS = '.*? (?P<Unit>.+?) (?P<Load>.+?) (?P<Active>.+?) (?P<Sub>.+?) (?P<Description>.+)'
+            SYSTEMD_FAILED_UNITS = '^(?P<Unit>\S+)\s+(?P<Load>\S+)\s+(?P<Active>\S+)\s+(?P<Sub>\S+)\s+(?P<Description>.+)'
+            SYSTEMD_EXPOSURE = 'Overall exposure level for (?P<Unit>.+?): (?P<Exposure>[0-9.]+) (?P<Risk>[A-Z]+)'
 
         class RULE_FIELD:
             LEVEL = 'Level'
@@ -70,6 +77,7 @@ class Constants:
             UNTIL = 'Until'
             FILTERS = 'Filters'
             REGEX = 'Regex'
+            FIELDS = 'Fields'
 
         class RULE_TYPE:
             REGEX = 'Regex'
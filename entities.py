@@ -1,10 +1,33 @@
+from definitions.constants import Constants
+import re
+
 class Rule:
-    
-    def __init__(self, id, rule_type, since, until, filters, regex, ):
+
+    def __init__(self, id, rule_type, since, until, filters, regex, fields = None):
         self.id = id
         self.rule_type = rule_type
         self.since = since
         self.until = until
         if filters:
             self.filters = filters.split(',')
+        else:
+            self.filters = []
         self.regex = regex
+        # Fields of a journal entry the rule matches on, when empty the rule keeps matching on the whole entry or its message
+        if fields:
+            self.fields = fields.split(',')
+        else:
+            self.fields = []
+
+        self._compile()
+
+    # The pattern of each rule is compiled only once, so matching an entry never depends on the re module cache nor builds new patterns
+    def _compile(self):
+        if self.rule_type == Constants.RULE_TYPE.FILTERED:
+            #If not done what follows, when using the rule id on the regex it will fail if the rule id contains the spaces, hence we remove them
+            id_without_spaces = self.id.replace(' ', '')
+            self.pattern = re.compile('(?P<' + id_without_spaces + '>.*)')
+        elif self.regex is not None:
+            self.pattern = re.compile(self.regex)
+        else:
+            self.pattern = None
@@ -0,0 +1,138 @@
+from utils import atomic_write
+import hashlib
+import json
+import os
+import stat
+import time
+
+# Keeps the results of expensive commands between runs, they are reused while the files they depend on are unchanged and they are not older than their time to live
+class ResultCache:
+
+    def __init__(self, state_path):
+        self.path = os.path.join(state_path, 'cache')
+
+    def _get_path(self, key):
+        return os.path.join(self.path, hashlib.sha256(key.encode()).hexdigest() + '.json')
+
+    # Returns the stored results and the time they were stored, or None if they are missing, stale or expired
+    def get(self, key, signature, ttl):
+        try:
+            with open(self._get_path(key)) as cache_file:
+                entry = json.load(cache_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if entry['signature'] != signature or time.time() - entry['time'] > ttl:
+            return None
+
+        return entry['output'], entry['time']
+
+    def set(self, key, signature, output):
+        entry = {'signature': signature, 'time': time.time(), 'output': output}
+
+        with atomic_write(self._get_path(key)) as cache_file:
+            json.dump(entry, cache_file)
+
+# Keeps the digests of files between runs keyed by their stat, a file is only hashed again when it is replaced, resized or modified. The change time is part of the key too, since unlike the modification time it can not be set back. Every algorithm a file was hashed with is kept.
+class HashCache:
+
+    def __init__(self, state_path, name):
+        self.path = os.path.join(state_path, 'cache', name + '_hashes.json')
+        self.hashes = self._load()
+        # Only the files looked up in this run are kept, so the cache never grows with files that no longer exist
+        self.current_hashes = {}
+
+    def _load(self):
+        try:
+            with open(self.path) as cache_file:
+                return json.load(cache_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _get_key(self, stats):
+        return [stats.st_dev, stats.st_ino, stats.st_size, stats.st_mtime_ns, stats.st_ctime_ns]
+
+    def get(self, path, stats, algorithm):
+        entry = self.hashes.get(path, None)
+
+        if entry is None or entry[:5] != self._get_key(stats) or algorithm not in entry[5]:
+            return None
+
+        self.current_hashes.setdefault(path, entry)
+
+        return entry[5][algorithm]
+
+    def set(self, path, stats, algorithm, digest):
+        key = self._get_key(stats)
+        entry = self.current_hashes.get(path, None)
+
+        if entry is None or entry[:5] != key:
+            entry = self.current_hashes[path] = key + [{}]
+
+        entry[5][algorithm] = digest
+
+    def save(self):
+        with atomic_write(self.path) as cache_file:
+            json.dump(self.current_hashes, cache_file)
+
+# Signature of the state of the given paths, it changes whenever a file is replaced, resized or modified. The direct entries of a directory are included since modifying them does not always change the directory itself.
+def get_signature(paths):
+    state = []
+
+    for path in paths:
+        try:
+            stats = os.stat(path)
+        except FileNotFoundError:
+            state.append([path, None])
+            continue
+
+        item = [path, stats.st_ino, stats.st_size, stats.st_mtime_ns]
+
+        if stat.S_ISDIR(stats.st_mode):
+            entries = []
+            with os.scandir(path) as iterator:
+                for entry in iterator:
+                    try:
+                        entry_stats = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    entries.append([entry.name, entry_stats.st_ino, entry_stats.st_size, entry_stats.st_mtime_ns])
+            item.append(sorted(entries))
+
+        state.append(item)
+
+    return hashlib.sha256(json.dumps(state).encode()).hexdigest()
+
+# Keeps results keyed by a digest of everything they are computed from, so an entry is never stale and is reused for as long as it is kept. Once there are more than max_entries, the least recently used ones are evicted.
+class ContentCache:
+
+    def __init__(self, state_path, name, max_entries):
+        self.path = os.path.join(state_path, 'cache', name + '_results.json')
+        self.max_entries = max_entries
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as cache_file:
+                return json.load(cache_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def get(self, key):
+        entry = self.entries.get(key, None)
+
+        if entry is None:
+            return None
+
+        entry[0] = time.time()
+
+        return entry[1]
+
+    def set(self, key, result):
+        self.entries[key] = [time.time(), result]
+
+    def save(self):
+        entries = sorted(self.entries.items(), key=lambda item: item[1][0])[-self.max_entries:]
+
+        with atomic_write(self.path) as cache_file:
+            json.dump(dict(entries), cache_file)
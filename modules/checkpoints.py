@@ -0,0 +1,27 @@
+from utils import atomic_write
+import json
+import os
+
+# Persists between runs how far each log source has been parsed, so only the new data is parsed on the next run
+class CheckpointManager:
+
+    def __init__(self, state_path):
+        self.path = os.path.join(state_path, 'checkpoints.json')
+        self.checkpoints = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as checkpoints_file:
+                return json.load(checkpoints_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def get(self, key):
+        return self.checkpoints.get(key, None)
+
+    def set(self, key, checkpoint):
+        self.checkpoints[key] = checkpoint
+
+    def save(self):
+        with atomic_write(self.path) as checkpoints_file:
+            json.dump(self.checkpoints, checkpoints_file)
@@ -1,10 +1,12 @@
-from modules.parsers import GenericParser, GenericBlockParser, JournalLogParser, GenericCommandParser
+from modules.parsers import GenericParser, GenericBlockParser, JournalLogParser, GenericCommandParser, PackageVerifierParser
 from definitions.constants import Constants
 from multiprocessing import Pool
 from modules.remotes import RemoteManager, Remote
 from modules.services import ServiceManager
 from modules.reports import ReportManager
 from modules.local import CheckerManager, FileChecker
+from modules.checkpoints import CheckpointManager
+from utils import size_parser
 
 class Controller:
 
@@ -13,6 +15,7 @@ class Controller:
         self.scope = config.scope
 
         self.report_manager = ReportManager(self.config)
+        self.checkpoint_manager = CheckpointManager(self.config.state_path)
 
         self.parsers = []
         self.definitions = []
@@ -46,6 +49,13 @@ class Controller:
     def _setup_parser(self, section, scope):
         path = self.config.get_value(section, 'Path')
         command = self.config.get_value(section, 'Command')
+        verifier = self.config.get_value(section, 'Verifier')
+        is_command = False
+        chunk_size = self.config.get_value(section, 'ChunkSize')
+        timestamp_format = self.config.get_raw_value(section, 'TimestampFormat')
+
+        if chunk_size is not None:
+            chunk_size = size_parser(chunk_size)
 
         if path is not None:
             rules_path = self.config.get_value(section, 'RulesFile')
@@ -57,16 +67,34 @@ class Controller:
             parser_type = self.config.get_value(section, 'Type')
             is_command = True
         
-        if not is_command:
+        if verifier is not None:
+            rules_path = self.config.get_value(section, 'RulesFile')
+
+            parser = PackageVerifierParser(rules_path, scope, verifier, self.config.state_path)
+        elif not is_command:
             if parser_type is None or parser_type == Constants.SECTION.TYPE_LINE:
-                parser = GenericParser(rules_path, scope, path)
+                use_mmap = self.config.get_boolean(section, 'Mmap')
+
+                parser = GenericParser(rules_path, scope, path, chunk_size, use_mmap, timestamp_format, self.config.state_path)
             elif parser_type == Constants.SECTION.TYPE_BLOCK:
                 start_delimiter = self.config.get_value(section, 'StartDelimiter')
                 end_delimiter = self.config.get_value(section,'EndDelimiter')
 
-                parser = GenericBlockParser(rules_path, scope, start_delimiter, end_delimiter, path)
+                parser = GenericBlockParser(rules_path, scope, start_delimiter, end_delimiter, path, chunk_size, timestamp_format, self.config.state_path)
         else:
-            parser = GenericCommandParser(rules_path, scope, command)
+            timeout = self.config.get_value(section, 'Timeout')
+            if timeout is not None:
+                timeout = float(timeout)
+
+            dependencies = self.config.get_value(section, 'Dependencies')
+            if dependencies is not None:
+                dependencies = dependencies.split(',')
+
+            cache_ttl = self.config.get_value(section, 'CacheTTL')
+            if cache_ttl is not None:
+                cache_ttl = float(cache_ttl)
+
+            parser = GenericCommandParser(rules_path, scope, command, timeout, dependencies, cache_ttl, self.config.use_cache, self.config.state_path)
 
         self.parsers.append(parser)
 
@@ -100,15 +128,43 @@ class Controller:
         tasks = []
 
         for parser in self.parsers:
-            if parser.isParallelizable:
-                tasks.append((pool.apply_async(parser.parse), parser.scope))
+            if parser.scope == Constants.SCOPE.LOG:
+                self._resume_parser(parser)
+
+            if parser.isParallelizable and parser.isSplittable:
+                # Each file and chunk of the source is parsed by a different worker and then merged back in order, the results are spooled to files so they are never held in memory
+                processes = [pool.apply_async(parser.spool_chunk, chunk) for chunk in parser.get_chunks()]
+                tasks.append((parser, processes))
+            elif parser.isParallelizable:
+                tasks.append((parser, pool.apply_async(parser.parse)))
             else:
                 result = parser.parse()
                 self._generate_report(result, parser.scope)
         
-        for process, scope in tasks:
-            result = process.get()
-            self._generate_report(result, scope)
+        for parser, process in tasks:
+            if isinstance(process, list):
+                header, spools = parser.merge_spools([chunk.get() for chunk in process])
+                self.report_manager.generate_spooled_report(header, spools, parser.scope)
+            else:
+                result = process.get()
+                self._generate_report(result, parser.scope)
+
+        # Checkpoints are only stored once their parsers finished
+        for parser in self.parsers:
+            if parser.checkpoint is not None:
+                self.checkpoint_manager.set(self._get_checkpoint_key(parser), parser.checkpoint)
+        self.checkpoint_manager.save()
+
+    # Logs are only parsed from where the previous run stopped, unless a full scan was requested
+    def _resume_parser(self, parser):
+        checkpoint = None
+        if not self.config.full_scan:
+            checkpoint = self.checkpoint_manager.get(self._get_checkpoint_key(parser))
+
+        parser.resume(checkpoint)
+
+    def _get_checkpoint_key(self, parser):
+        return f'{parser.source}:{parser.rules_path}'
     
     def _process_remotes(self):
 
@@ -123,15 +179,10 @@ class Controller:
             self._generate_report(result, Constants.SCOPE.REMOTE)
 
     def _process_services(self):
-        pool = Pool()
-        processes = []
         results = []
 
-        for service in self.service_manager.services:
-            processes.append(pool.apply_async(service.analyze))
-            
-        for process in processes:
-            result = process.get()
+        # The services are analyzed in batches by the service manager
+        for result in self.service_manager.analyze():
             if result:
                 results.append(result)
 
@@ -0,0 +1,150 @@
+from array import array
+from collections.abc import Mapping
+from itertools import accumulate
+from utils import atomic_write
+import marshal
+import os
+import re
+import sys
+
+# Fields of the entries are key=value pairs separated by spaces, the parts of a value enclosed in double quotes may contain spaces and equals signs
+FIELD_REGEX = re.compile(r'([^\s="]+)=((?:[^\s"]+|"[^"]*"?)+)')
+# Changing the layout of the cache files or the parsing of the databases invalidates the existing ones
+CACHE_VERSION = 2
+
+# Entry of a database, a read only mapping of its keys to its values. The tuple of keys is shared by every entry with the same keys, so an entry only holds its values.
+class DatabaseEntry(Mapping):
+    __slots__ = ('field_keys', 'field_values')
+
+    def __init__(self, keys, values):
+        self.field_keys = keys
+        self.field_values = values
+
+    def __getitem__(self, key):
+        if key not in self.field_keys:
+            raise KeyError(key)
+
+        return self.field_values[self.field_keys.index(key)]
+
+    def __iter__(self):
+        return iter(self.field_keys)
+
+    def __len__(self):
+        return len(self.field_keys)
+
+    def __contains__(self, key):
+        return key in self.field_keys
+
+    def get(self, key, default = None):
+        if key not in self.field_keys:
+            return default
+
+        return self.field_values[self.field_keys.index(key)]
+
+    def items(self):
+        return zip(self.field_keys, self.field_values)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+# Entries of a database stored by columns: the layout (tuple of keys) of every entry, and every value concatenated in a single string with their offsets. It is loaded from its cache without creating an object per entry, the entries are created as they are read.
+class Database:
+
+    def __init__(self, layouts, layout_ids, values, value_offsets, entry_offsets):
+        self.layouts = layouts
+        self.layout_ids = layout_ids
+        self.values = values
+        self.value_offsets = value_offsets
+        self.entry_offsets = entry_offsets
+
+    def __len__(self):
+        return len(self.layout_ids)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+
+        keys = self.layouts[self.layout_ids[index]]
+        start = self.entry_offsets[index]
+        offsets = self.value_offsets
+
+        return DatabaseEntry(keys, tuple(self.values[offsets[value]:offsets[value + 1]] for value in range(start, start + len(keys))))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+# Loads a database from its binary cache next to it, which is built again when the size or modification time of the database change
+def load_database(database_path):
+    stats = os.stat(database_path)
+    cache_path = database_path + '.cache'
+
+    database = _load_cache(cache_path, stats)
+
+    if database is None:
+        database = _parse_database(database_path)
+        _save_cache(cache_path, stats, database)
+
+    return database
+
+def _parse_database(database_path):
+    layouts = {}
+    layout_ids = array('I')
+    values = []
+    entry_offsets = array('Q')
+
+    with open(database_path) as database_file:
+        for line in database_file:
+            # An unterminated quoted value would otherwise keep the line break
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            entry_offsets.append(len(values))
+            fields = FIELD_REGEX.findall(line)
+
+            if '"' in line:
+                # Empty values are ignored
+                fields = [(key, value.replace('"', '')) for key, value in fields if value.replace('"', '')]
+
+            values += [value for _, value in fields]
+            # The entries with the same keys share the tuple of the first one
+            layout_ids.append(layouts.setdefault(tuple([key for key, _ in fields]), len(layouts)))
+
+    return Database(list(layouts), layout_ids, ''.join(values), array('Q', accumulate(map(len, values), initial=0)), entry_offsets)
+
+def _load_cache(cache_path, stats):
+    try:
+        with open(cache_path, 'rb') as cache_file:
+            cache = marshal.load(cache_file)
+    except (FileNotFoundError, EOFError, ValueError, TypeError):
+        return None
+
+    # A cache written with another layout is checked before being unpacked
+    if not isinstance(cache, tuple) or len(cache) != 8 or cache[0] != CACHE_VERSION:
+        return None
+
+    version, size, mtime, layouts, layout_ids, values, value_offsets, entry_offsets = cache
+
+    if size != stats.st_size or mtime != stats.st_mtime_ns:
+        return None
+
+    return Database([tuple(sys.intern(key) for key in keys) for keys in layouts], _to_array('I', layout_ids), values, _to_array('Q', value_offsets), _to_array('Q', entry_offsets))
+
+def _save_cache(cache_path, stats, database):
+    cache = (CACHE_VERSION, stats.st_size, stats.st_mtime_ns, database.layouts, database.layout_ids.tobytes(), database.values, database.value_offsets.tobytes(), database.entry_offsets.tobytes())
+
+    # The cache is only an optimization, a database in a read only location is just parsed every time
+    try:
+        with atomic_write(cache_path, 'wb') as cache_file:
+            marshal.dump(cache, cache_file)
+    except OSError:
+        pass
+
+def _to_array(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+
+    return values
@@ -0,0 +1,169 @@
+from definitions.constants import Constants
+import re
+
+QUANTIFIER_REGEX = re.compile(r'\{\d*(,\d*)?\}')
+# A whole escape sequence of a regex: hexadecimal, unicode, named and octal escapes, backreferences, or a single escaped character
+ESCAPE_REGEX = re.compile(r'\\(x[0-9a-fA-F]{0,2}|u[0-9a-fA-F]{0,4}|U[0-9a-fA-F]{0,8}|N\{[^}]*\}|0[0-7]{0,2}|[1-7][0-7]{2}|[1-9][0-9]?|.)', re.DOTALL)
+
+# The rule engine matches an entry against all the rules of a rules file in two stages. First it decides which rules could match the entry by checking the literals that every match of a rule must contain (the filters and the literal text of the regex), then it only runs the compiled regex of those candidates. Every distinct literal is only looked for once per entry, however many rules share it.
+class RuleEngine:
+
+    def __init__(self, rules):
+        self.rules = rules
+
+        self._setup_literals()
+
+    def _setup_literals(self):
+        literal_ids = {}
+        # rule ==> ids of the literals that must all be present in an entry for the rule to match
+        self.literals = []
+
+        for rule in self.rules:
+            literals = list(rule.filters) if rule.rule_type != Constants.RULE_TYPE.REGEX else []
+
+            if rule.rule_type != Constants.RULE_TYPE.FILTERED and rule.regex is not None:
+                required = required_literals(rule.regex)
+                if len(required) > 0:
+                    # The longest literal is the most selective one
+                    literals.append(max(required, key=len))
+
+            ids = set()
+            for literal in literals:
+                # An empty literal is always present
+                if len(literal) > 0:
+                    ids.add(literal_ids.setdefault(literal, len(literal_ids)))
+
+            self.literals.append((rule, frozenset(ids)))
+
+        self._setup_literal_masks(list(literal_ids))
+        self._setup_line_pattern(list(literal_ids))
+
+    # Each distinct literal along with the mask of the rules needing it, the rule at index i of the rules file being the bit i. An entry missing a literal discards every rule of its mask at once.
+    def _setup_literal_masks(self, literals):
+        masks = [0] * len(literals)
+
+        for index, (rule, ids) in enumerate(self.literals):
+            for id in ids:
+                masks[id] |= 1 << index
+
+        self.literal_masks = list(zip(literals, masks))
+        self.rule_bits = [(1 << index, rule) for index, (rule, _) in enumerate(self.literals)]
+        self.all_rules = (1 << len(self.literals)) - 1
+
+    # Bytes pattern that finds every line of a raw buffer which could match at least one rule, the longest literal of each rule is enough since every match of the rule contains it. It can only exist when every rule has a literal, otherwise any line could match.
+    def _setup_line_pattern(self, literals):
+        self.line_pattern = None
+        chosen = set()
+
+        for rule, ids in self.literals:
+            candidates = [literals[id] for id in ids if '\n' not in literals[id]]
+            if len(candidates) == 0:
+                return
+            chosen.add(max(candidates, key=len))
+
+        if len(chosen) > 0:
+            self.line_pattern = re.compile(b'|'.join(re.escape(literal.encode()) for literal in sorted(chosen)))
+
+    # Returns a list of (rule, groupdict) for every rule matching the entry, keeping the order of the rules file
+    def match(self, entry):
+        output = []
+        # Mask of the rules missing at least one of their literals
+        discarded = 0
+
+        for literal, mask in self.literal_masks:
+            if literal not in entry:
+                discarded |= mask
+
+        if discarded == self.all_rules:
+            return output
+
+        for bit, rule in self.rule_bits:
+            if not discarded & bit:
+                match = rule.pattern.search(entry)
+
+                if match:
+                    output.append((rule, match.groupdict()))
+
+        return output
+
+# Returns the runs of literal text found at the top level of a regex, every match of the regex contains all of them. It is conservative, anything that is not plain literal text ends the current run and alternations or inline flags discard every run.
+def required_literals(regex):
+    literals = []
+    current = ''
+    depth = 0
+    in_class = False
+    index = 0
+    length = len(regex)
+
+    while index < length:
+        char = regex[index]
+
+        if char == '\\':
+            escape = ESCAPE_REGEX.match(regex, index)
+            escaped = escape.group(1) if escape else ''
+            # Only escaped punctuation is literal text, escapes starting with a letter or a digit are character classes, code points or backreferences and are skipped whole
+            if depth == 0 and not in_class and len(escaped) == 1 and not escaped.isalnum():
+                current += escaped
+            elif depth == 0 and not in_class:
+                literals.append(current)
+                current = ''
+            index = escape.end() if escape else length
+            continue
+
+        if in_class:
+            if char == ']':
+                in_class = False
+            index += 1
+            continue
+
+        if char == '[':
+            in_class = True
+            index += 1
+            if regex[index:index + 1] == '^':
+                index += 1
+            # A closing bracket right after the opening one is a literal
+            if regex[index:index + 1] == ']':
+                index += 1
+            if depth == 0:
+                literals.append(current)
+                current = ''
+            continue
+
+        if char == '(':
+            if regex.startswith('(?', index) and regex[index + 2:index + 3] in tuple('aiLmsux-'):
+                return []
+            if depth == 0:
+                literals.append(current)
+                current = ''
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth > 0:
+            pass
+        elif char == '|':
+            return []
+        elif char in '?*' or (char == '{' and QUANTIFIER_REGEX.match(regex, index)):
+            # The previous character might not be present
+            literals.append(current[:-1])
+            current = ''
+            if char == '{':
+                index = regex.index('}', index)
+            # Lazy and possessive modifiers of the quantifier
+            if regex[index + 1:index + 2] in ('?', '+'):
+                index += 1
+        elif char == '+':
+            literals.append(current)
+            current = ''
+            if regex[index + 1:index + 2] in ('?', '+'):
+                index += 1
+        elif char in '.^$':
+            literals.append(current)
+            current = ''
+        else:
+            current += char
+
+        index += 1
+
+    literals.append(current)
+
+    return [literal for literal in literals if len(literal) > 0]
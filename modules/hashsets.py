@@ -0,0 +1,175 @@
+from utils import atomic_write
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+
+# Header of a compiled hash set: magic, digest size, amount of digests, size of the Bloom filter in bits, and size and modification time of the source it was compiled from
+HEADER = struct.Struct('<8sIQQQQ')
+MAGIC = b'SYSHSET1'
+# A Bloom filter of 10 bits per digest probed 7 times gives about 1% of false positives
+BLOOM_BITS_PER_DIGEST = 10
+BLOOM_HASH_COUNT = 7
+# Amount of digests sorted in memory at once while compiling a set, the sorted runs are then merged
+COMPILE_RUN_SIZE = 1024 ** 2
+# Amount of bytes read at once from a sorted run while merging
+RUN_READ_SIZE = 1024 ** 2
+
+# Set of known digests of an algorithm, read from a text file with a digest at the start of every line (like the output of md5sum or sha256sum, or CSV files with the digest in the first column). The file is compiled once into sorted fixed-width digests followed by a Bloom filter, which is memory mapped, so looking up a digest costs a few probes of the filter and a binary search whatever the size of the set. It is compiled again when the source changes.
+class HashSet:
+
+    def __init__(self, source_path, algorithm, state_path):
+        self.source_path = source_path
+        self.algorithm = algorithm
+        self.digest_size = hashlib.new(algorithm).digest_size
+        self.path = os.path.join(state_path, 'hashsets', hashlib.sha256(f'{os.path.abspath(source_path)}:{algorithm}'.encode()).hexdigest() + '.bin')
+
+        stats = os.stat(source_path)
+        if not self._is_current(stats):
+            self._compile(stats)
+
+        self._open()
+
+    def __contains__(self, hex_digest):
+        try:
+            digest = bytes.fromhex(hex_digest)
+        except ValueError:
+            return False
+
+        if len(digest) != self.digest_size:
+            return False
+
+        # Most of the digests that are not in the set are rejected by the filter without searching
+        for bit in _get_bloom_bits(digest, self.bloom_bits):
+            if not self.map[self.bloom_offset + (bit >> 3)] & (1 << (bit & 7)):
+                return False
+
+        low = 0
+        high = self.count
+
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * self.digest_size
+            value = self.map[offset:offset + self.digest_size]
+
+            if value < digest:
+                low = middle + 1
+            elif value > digest:
+                high = middle
+            else:
+                return True
+
+        return False
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def _is_current(self, stats):
+        try:
+            with open(self.path, 'rb') as compiled_file:
+                header = compiled_file.read(HEADER.size)
+        except FileNotFoundError:
+            return False
+
+        if len(header) != HEADER.size:
+            return False
+
+        magic, digest_size, _, _, source_size, source_mtime = HEADER.unpack(header)
+
+        return magic == MAGIC and digest_size == self.digest_size and source_size == stats.st_size and source_mtime == stats.st_mtime_ns
+
+    def _open(self):
+        self.file = open(self.path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        _, _, self.count, self.bloom_bits, _, _ = HEADER.unpack(self.map[:HEADER.size])
+        self.bloom_offset = HEADER.size + self.count * self.digest_size
+
+    # The digests are sorted in runs that fit in memory, which are then merged removing the duplicates, so sets larger than the memory can be compiled
+    def _compile(self, stats):
+        runs = []
+        run = []
+        total = 0
+
+        try:
+            with open(self.source_path, 'rb') as source_file:
+                for line in source_file:
+                    digest = _parse_digest(line, self.digest_size)
+                    if digest is None:
+                        continue
+
+                    run.append(digest)
+                    total += 1
+
+                    if len(run) >= COMPILE_RUN_SIZE:
+                        runs.append(_write_run(run))
+                        run = []
+
+            run.sort()
+
+            bloom_bits = max(8, (total * BLOOM_BITS_PER_DIGEST + 7) // 8 * 8)
+            bloom = bytearray(bloom_bits // 8)
+            count = 0
+
+            with atomic_write(self.path, 'wb') as compiled_file:
+                compiled_file.write(HEADER.pack(MAGIC, self.digest_size, 0, bloom_bits, stats.st_size, stats.st_mtime_ns))
+
+                previous = None
+                for digest in heapq.merge(run, *[_read_run(run_file, self.digest_size) for run_file in runs]):
+                    if digest == previous:
+                        continue
+
+                    compiled_file.write(digest)
+                    previous = digest
+                    count += 1
+
+                    for bit in _get_bloom_bits(digest, bloom_bits):
+                        bloom[bit >> 3] |= 1 << (bit & 7)
+
+                compiled_file.write(bloom)
+
+                compiled_file.seek(0)
+                compiled_file.write(HEADER.pack(MAGIC, self.digest_size, count, bloom_bits, stats.st_size, stats.st_mtime_ns))
+        finally:
+            for run_file in runs:
+                run_file.close()
+
+# Returns the digest at the start of a line as bytes, or None if the line does not start with a digest of the size
+def _parse_digest(line, digest_size):
+    fields = line.replace(b',', b' ').split(maxsplit=1)
+    if len(fields) == 0:
+        return None
+
+    try:
+        digest = bytes.fromhex(fields[0].strip(b'"').decode('ascii'))
+    except ValueError:
+        return None
+
+    return digest if len(digest) == digest_size else None
+
+def _write_run(run):
+    run_file = tempfile.TemporaryFile()
+    run_file.write(b''.join(sorted(run)))
+
+    return run_file
+
+def _read_run(run_file, digest_size):
+    run_file.seek(0)
+    chunk_size = RUN_READ_SIZE // digest_size * digest_size
+
+    while chunk := run_file.read(chunk_size):
+        for offset in range(0, len(chunk), digest_size):
+            yield chunk[offset:offset + digest_size]
+
+# The digests are already uniformly distributed, so the positions of a digest in the filter are derived from its bytes by double hashing
+def _get_bloom_bits(digest, bloom_bits):
+    first = int.from_bytes(digest[:8], 'little')
+    second = int.from_bytes(digest[8:16], 'little') | 1
+
+    return [(first + index * second) % bloom_bits for index in range(BLOOM_HASH_COUNT)]
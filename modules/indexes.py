@@ -0,0 +1,173 @@
+from datetime import datetime, timezone
+from bisect import bisect_left, bisect_right
+from utils import atomic_write, get_fingerprint, FINGERPRINT_SIZE
+import hashlib
+import json
+import os
+
+# Amount of bytes between two samples of a timestamp index
+INDEX_INTERVAL = 64 * 1024
+# Formatting any aware time gives the width of the timestamps of a fixed width format, including its timezone
+REFERENCE_TIME = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+# Formats without a year are parsed in the current year, or in the previous one when that would put the timestamp further than this amount of seconds in the future, like the lines logged before the new year
+FUTURE_MARGIN = 24 * 60 * 60
+
+# Parses the timestamp at the start of a line with a fixed width strptime format, returning it in seconds since the epoch or None if the line does not start with a timestamp
+class TimestampParser:
+
+    def __init__(self, timestamp_format, now = None):
+        self.format = timestamp_format
+        self.width = len(REFERENCE_TIME.strftime(timestamp_format))
+        self._setup_year(now or datetime.now())
+
+    # Logs like syslog do not write the year, strptime would take them as logged in 1900
+    def _setup_year(self, now):
+        self.year = None
+
+        try:
+            has_year = datetime.strptime(REFERENCE_TIME.strftime(self.format), self.format).year == REFERENCE_TIME.year
+        except ValueError:
+            has_year = True
+
+        if not has_year:
+            self.year = now.year
+            self.latest = now.timestamp() + FUTURE_MARGIN
+
+    def parse(self, line):
+        try:
+            if self.year is None:
+                # Times without a timezone are taken as local times
+                return datetime.strptime(line[:self.width], self.format).timestamp()
+
+            timestamp = self._parse_in_year(line, self.year)
+            if timestamp > self.latest:
+                timestamp = self._parse_in_year(line, self.year - 1)
+
+            return timestamp
+        except ValueError:
+            return None
+
+    # The year is parsed along with the timestamp, so the 29th of February is valid in leap years
+    def _parse_in_year(self, line, year):
+        return datetime.strptime(f'{year} {line[:self.width]}', '%Y ' + self.format).timestamp()
+
+# Sparse index of the timestamps of a log file, it keeps the offset and timestamp of the first timestamped line after every INDEX_INTERVAL bytes, so the lines of a time window are found with a binary search and a short scan instead of reading the file. It is built lazily, extended as the file grows, rebuilt if the file is replaced and persisted between runs. The timestamps are expected to never decrease along the file.
+class TimestampIndex:
+
+    def __init__(self, path, timestamp_parser, state_path):
+        self.path = path
+        self.parser = timestamp_parser
+        self.index_path = os.path.join(state_path, 'indexes', hashlib.sha256(os.path.abspath(path).encode()).hexdigest() + '.json')
+
+    # Narrows the byte range [start, end) of the file to the lines logged from since until until, both in seconds since the epoch and None when unbounded. An end of None means the end of the file.
+    def get_range(self, since, until, start, end):
+        with open(self.path, 'rb') as file:
+            stats = os.fstat(file.fileno())
+            size = stats.st_size if end is None else end
+
+            self._load(file, stats)
+            if self._extend(file, stats.st_size):
+                self._save(stats)
+
+            if since is not None:
+                start = max(start, self._find(file, since, False, size))
+
+            if until is not None:
+                window_end = max(start, self._find(file, until, True, size))
+                if window_end < size:
+                    end = window_end
+
+        return start, end
+
+    def _load(self, file, stats):
+        self.samples = []
+        self.next_offset = 0
+
+        try:
+            with open(self.index_path) as index_file:
+                index = json.load(index_file)
+        except (FileNotFoundError, ValueError):
+            return
+
+        file.seek(0)
+        head = file.read(FINGERPRINT_SIZE)
+
+        # The index is discarded if the file was replaced or truncated
+        if index['inode'] != stats.st_ino or index['format'] != self.parser.format or index['next_offset'] > stats.st_size:
+            return
+        if get_fingerprint(head, index['length']) != index['fingerprint']:
+            return
+
+        self.samples = index['samples']
+        self.next_offset = index['next_offset']
+
+    # Samples the file from where the index stopped, returns whether new samples were added
+    def _extend(self, file, size):
+        extended = False
+
+        while self.next_offset < size:
+            sample = self._sample(file, self.next_offset, size)
+            # There is no complete timestamped line yet, it is sampled again on the next run
+            if sample is None:
+                break
+
+            self.samples.append(sample)
+            self.next_offset = (sample[0] // INDEX_INTERVAL + 1) * INDEX_INTERVAL
+            extended = True
+
+        return extended
+
+    # Returns [offset, timestamp] of the first complete timestamped line starting at or after the offset
+    def _sample(self, file, offset, size):
+        if offset == 0:
+            file.seek(0)
+        else:
+            file.seek(offset - 1)
+            file.readline()
+        position = file.tell()
+
+        while position < size:
+            line = file.readline()
+            if position + len(line) > size or not line.endswith(b'\n'):
+                return None
+
+            timestamp = self.parser.parse(line[:self.parser.width].decode(errors='replace'))
+            if timestamp is not None:
+                return [position, timestamp]
+
+            position += len(line)
+
+        return None
+
+    # Offset of the first line whose timestamp is at or after the time, or strictly after it, found between the two samples around the time
+    def _find(self, file, time, after, size):
+        timestamps = [sample[1] for sample in self.samples]
+        index = bisect_right(timestamps, time) if after else bisect_left(timestamps, time)
+
+        position = self.samples[index - 1][0] if index > 0 else 0
+        limit = min(self.samples[index][0], size) if index < len(self.samples) else size
+
+        file.seek(position)
+
+        while position < limit:
+            line = file.readline()
+            if not line:
+                break
+
+            timestamp = self.parser.parse(line[:self.parser.width].decode(errors='replace'))
+            if timestamp is not None and (timestamp > time if after else timestamp >= time):
+                return position
+
+            position += len(line)
+
+        return min(position, limit)
+
+    def _save(self, stats):
+        with open(self.path, 'rb') as file:
+            head = file.read(FINGERPRINT_SIZE)
+
+        index = {'inode': stats.st_ino, 'format': self.parser.format, 'fingerprint': get_fingerprint(head, len(head)), 'length': len(head), 'next_offset': self.next_offset, 'samples': self.samples}
+
+        with atomic_write(self.index_path) as index_file:
+            json.dump(index, index_file)
@@ -1,13 +1,37 @@
 from definitions.constants import Constants
-import hashlib
+from modules.caches import HashCache
+from modules.hashsets import HashSet
+from modules.databases import load_database
+from modules.procfs import ProcSnapshot
+from modules.sockdiag import get_listening_sockets
+from concurrent.futures import ThreadPoolExecutor
+from utils import hash_file_digests, check_parallel, get_user_name, get_group_name
+from collections import deque
+from datetime import datetime
+import fnmatch
+import random
+import re
 import os
-import pwd
-import grp
-import socket
-try:
-    import psutil
-except ImportError:
-    print('psutil module not available, please make sure to install it.')
+
+# Digests that the entries of the filesystem database can be checked against, each one is given by a key with its name
+DIGEST_ALGORITHMS = ['md5', 'sha256', 'blake2b']
+# Fraction of the files hashed again on every paranoid run even if their stat did not change
+PARANOID_SAMPLE_RATE = 0.05
+# Digest written for every file of a generated baseline
+BASELINE_ALGORITHM = 'sha256'
+# Keys of the entries covering a directory, the rest of their attributes are expected from every file inside it
+DIRECTORY_KEYS = ['dir', 'recursive']
+# Amount of directories read ahead by the threads of the walker, so a wide tree never holds the contents of every directory at once
+WALK_READ_AHEAD = 64
+# Digest the files are looked up with in a hash set without algorithm
+DEFAULT_HASH_SET_ALGORITHM = 'sha256'
+# Keys of the process rules matched exactly, in the order they are preferred to index a rule by, the most selective first
+PROCESS_INDEX_KEYS = ['pid', 'cmdline', 'name', 'username']
+# Keys of the process rules matching the command line with a glob or a regular expression, with the value they match and the function compiling them once into a matching function
+PROCESS_PATTERN_KEYS = {
+    'cmdline_glob': ('cmdline', lambda pattern: re.compile(fnmatch.translate(pattern)).match),
+    'cmdline_regex': ('cmdline', lambda pattern: re.compile(pattern).search),
+}
 
 class CheckerManager:
     
@@ -15,12 +39,14 @@ class CheckerManager:
         self.config = config
         self.checkers = self._setup_checkers()
 
+    # The processes and sockets are read once and shared by the checkers
     def _setup_checkers(self):
         checkers = []
+        snapshot = ProcSnapshot()
 
-        checkers.append(FileChecker())
-        checkers.append(PortChecker())
-        checkers.append(ProcessesChecker())
+        checkers.append(FileChecker(self.config.state_path, self.config.use_cache, self.config.paranoid))
+        checkers.append(PortChecker(snapshot))
+        checkers.append(ProcessesChecker(snapshot))
 
         return checkers
 
@@ -29,144 +55,291 @@ class Checker:
     isParallelizable = True
 
     def _load_database(self, database_file):
-        with open(database_file) as database_file:
-            database_entries = []
-
-            for line in database_file:
-                if not line.startswith('#') and not line.startswith('\n'):                    
-                    line = line.rstrip()
-
-                    entry = {}
-                    key = ''
-                    value = ''
-                    current_token = ''
-                    in_quotes = False
-
-                    for char in line:
-                        if char == '"':
-                            if in_quotes:
-                                in_quotes = False
-                            else:
-                                in_quotes = True
-                                continue
-
-                        if (char != '=' and char != ' ' and char != '"') or in_quotes:
-                            current_token += char
-                        
-                        if (char == '=' or char == ' ' or char == '"') and not in_quotes:
-                            if char == '=':
-                                key = current_token
-                            elif char == ' ' or char == '"':
-                                value = current_token
-                            
-                            current_token = ''
-                        
-                        if len(key) > 0 and len(value) > 0:
-                                entry[key] = value
-                                key = ''
-                                value = ''
-
-                    if len(value) == 0 and len(current_token) > 0:
-                        entry[key] = current_token
-                        key = ''
-                        value = ''
-
-                    database_entries.append(entry)
-
-            self.database = database_entries
+        self.database = load_database(database_file)
 
     def _generate_header(self, collection, total_entries):
         matched_entries = str(len(collection))
 
         return f'#Checker: {self.__pretty_name__} #Total entries: {total_entries} #Incorrect entries: {matched_entries}'
 
+# The digests of the files are kept in a hash cache between runs, so a file is only hashed again when its stat changes. Without use_cache every file is hashed but the digests are still cached, in paranoid mode a random sample of the files is hashed again on every run in case they were modified keeping their stat. Entries with dir instead of path cover every file of a directory, or of the whole tree below it with recursive=yes. The directories are read by a pool of threads as well.
 class FileChecker(Checker):
     __pretty_name__ = 'File Checker'
     
-    def __init__(self):
+    def __init__(self, state_path = Constants.PATH.DEFAULT_STATE_PATH, use_cache = True, paranoid = False):
         database_file = Constants.PATH.DATABASE.FILESYSTEM
         self._load_database(database_file)
 
+        self.state_path = state_path
+        self.use_cache = use_cache
+        self.paranoid = paranoid
+
     def analyze(self):
-        block_size = 4096
-        total_entries = len(self.database)
+        total_entries = 0
         results = []
 
+        self.hash_cache = HashCache(self.state_path, 'filesystem')
+        self.hash_sets = self._load_hash_sets()
+
+        with ThreadPoolExecutor(os.cpu_count()) as walker:
+            for result in check_parallel(self._expand_entries(walker), self._check_entry):
+                total_entries += 1
+                if len(result) > 0:
+                    results.append(result)
+
+        self.hash_cache.save()
+
+        for _, hash_set in self.hash_sets:
+            hash_set.close()
+
+        if len(results) > 0:
+            results = [self._generate_header(results, total_entries)] + results
+        else:
+            results = [self._generate_header(results, total_entries)]
+          
+        return results
+
+    # Writes a database with an entry for every file covered by the current database, holding the digest and attributes the file has now
+    def generate_baseline(self, baseline_path):
+        self.hash_cache = HashCache(self.state_path, 'filesystem')
+
+        with ThreadPoolExecutor(os.cpu_count()) as walker, open(baseline_path, 'w') as baseline_file:
+            baseline_file.write(f'# Baseline generated on {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}\n')
+
+            # The entries that do not cover files, like the hash sets, are kept as they are
+            for entry in self.database:
+                if 'path' not in entry and 'dir' not in entry:
+                    baseline_file.write(_format_entry(entry) + '\n')
+
+            for line in check_parallel(_unique_paths(self._expand_entries(walker)), self._get_baseline_entry):
+                if line is not None:
+                    baseline_file.write(line + '\n')
+
+        self.hash_cache.save()
+
+    # Entries with hashset give a file of known digests, every file checked must be in one of the whitelists and in none of the blacklists
+    def _load_hash_sets(self):
+        hash_sets = []
+
         for entry in self.database:
-            checksum = entry.get('md5', None)
-            file_path = entry.get('path', None)
-            perms = entry.get('perms', None)
-            owner = entry.get('owner', None)
-            group = entry.get('group', None)
-            result = {}
+            acl = entry.get('acl', None)
 
-            if checksum is not None:
-                md5hash = hashlib.md5()
+            if 'hashset' in entry and acl in ('whitelist', 'blacklist'):
+                hash_sets.append((acl, HashSet(entry['hashset'], entry.get('algorithm', DEFAULT_HASH_SET_ALGORITHM), self.state_path)))
 
-                try:
-                    with open(file_path, 'rb') as file:
-                        while block := file.read(block_size):
-                            md5hash.update(block)
-                
-                    if md5hash.hexdigest() != checksum:
-                        result['MD5 check'] = Constants.CHECK_STATUS.INCORRECT
-                except FileNotFoundError:
-                    result['MD5 check'] = Constants.CHECK_STATUS.INCORRECT
+        return hash_sets
 
+    # Yields (entry, stats) of every file to check, stats being None when the file has not been read yet
+    def _expand_entries(self, walker):
+        for entry in self.database:
+            directory = entry.get('dir', None)
+
+            if 'hashset' in entry:
+                continue
+            elif directory is None:
+                yield entry, None
+                continue
+
+            attributes = {key: value for key, value in entry.items() if key not in DIRECTORY_KEYS + DIGEST_ALGORITHMS}
+
+            # A missing directory is reported like a missing file
+            if not os.path.isdir(directory):
+                yield {**attributes, 'path': directory}, None
+                continue
+
+            for path, stats in _walk_files(walker, directory, entry.get('recursive', 'no') == 'yes'):
+                yield {**attributes, 'path': path}, stats
+
+    def _check_entry(self, item):
+        entry, stats = item
+        file_path = entry.get('path', None)
+        perms = entry.get('perms', None)
+        owner = entry.get('owner', None)
+        group = entry.get('group', None)
+        result = {}
+
+        # Files that can not be read (like the ones of other users when not running as root) are reported as such instead of aborting the whole check
+        if stats is None:
             try:
                 stats = os.stat(file_path)
             except FileNotFoundError:
-                result['Permisions check'] = Constants.CHECK_STATUS.INCORRECT
-                result['Owner check'] = Constants.CHECK_STATUS.INCORRECT
-                result['Group check'] = Constants.CHECK_STATUS.INCORRECT
+                pass
+            except OSError:
+                return {'Read check': Constants.CHECK_STATUS.ERROR, 'File': file_path}
+
+        checksums = {algorithm: entry[algorithm] for algorithm in DIGEST_ALGORITHMS if algorithm in entry}
+        algorithms = set(checksums) | {hash_set.algorithm for _, hash_set in self.hash_sets}
 
+        digests = {}
+        if stats is not None and len(algorithms) > 0:
+            try:
+                digests = self._get_digests(file_path, stats, sorted(algorithms))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                result['Read check'] = Constants.CHECK_STATUS.ERROR
+                checksums = {}
+
+        for algorithm, checksum in checksums.items():
+            if digests.get(algorithm, None) != checksum:
+                result[f'{algorithm.upper()} check'] = Constants.CHECK_STATUS.INCORRECT
+
+        if len(digests) > 0:
+            whitelists = [hash_set for acl, hash_set in self.hash_sets if acl == 'whitelist']
+            blacklists = [hash_set for acl, hash_set in self.hash_sets if acl == 'blacklist']
+
+            if len(whitelists) > 0 and not any(digests[hash_set.algorithm] in hash_set for hash_set in whitelists):
+                result['Hash whitelist check'] = Constants.CHECK_STATUS.INCORRECT
+            if any(digests[hash_set.algorithm] in hash_set for hash_set in blacklists):
+                result['Hash blacklist check'] = Constants.CHECK_STATUS.INCORRECT
+
+        if stats is None:
+            result['Permisions check'] = Constants.CHECK_STATUS.INCORRECT
+            result['Owner check'] = Constants.CHECK_STATUS.INCORRECT
+            result['Group check'] = Constants.CHECK_STATUS.INCORRECT
+        else:
             if perms is not None:
                 file_perms = oct(stats.st_mode)[-3:]
                 if file_perms != perms:
                     result['Permisions check'] = Constants.CHECK_STATUS.INCORRECT
-            
+
             if owner is not None:
-                file_owner = pwd.getpwuid(stats.st_uid).pw_name
+                file_owner = get_user_name(stats.st_uid)
                 if file_owner != owner:
                     result['Owner check'] = Constants.CHECK_STATUS.INCORRECT
 
             if group is not None:
-                file_group = grp.getgrgid(stats.st_gid).gr_name
+                file_group = get_group_name(stats.st_gid)
                 if file_group != group:
                     result['Group check'] = Constants.CHECK_STATUS.INCORRECT
 
-            if len(result) > 0:
-                result['File'] = file_path
-                results.append(result)
+        if len(result) > 0:
+            result['File'] = file_path
 
-        if len(results) > 0:
-            results = [self._generate_header(results, total_entries)] + results
-        else:
-            results = [self._generate_header(results, total_entries)]
-          
-        return results
+        return result
+
+    def _get_digests(self, path, stats, algorithms):
+        digests = {}
+
+        if self.use_cache and not (self.paranoid and random.random() < PARANOID_SAMPLE_RATE):
+            for algorithm in algorithms:
+                digest = self.hash_cache.get(path, stats, algorithm)
+                if digest is not None:
+                    digests[algorithm] = digest
+
+        missing = [algorithm for algorithm in algorithms if algorithm not in digests]
+
+        if len(missing) > 0:
+            for algorithm, digest in hash_file_digests(path, missing).items():
+                self.hash_cache.set(path, stats, algorithm, digest)
+                digests[algorithm] = digest
+
+        return digests
+
+    def _get_baseline_entry(self, item):
+        entry, stats = item
+        path = entry['path']
+
+        try:
+            if stats is None:
+                stats = os.stat(path)
+            digest = self._get_digests(path, stats, [BASELINE_ALGORITHM])[BASELINE_ALGORITHM]
+        except OSError:
+            return None
+
+        return _format_entry({BASELINE_ALGORITHM: digest, 'perms': oct(stats.st_mode)[-3:], 'owner': get_user_name(stats.st_uid), 'group': get_group_name(stats.st_gid), 'path': path})
+
+# Line of a database with the keys and values of the entry, values with spaces or equals signs are quoted
+def _format_entry(entry):
+    return ' '.join(f'{key}="{value}"' if any(char in value for char in ' =') else f'{key}={value}' for key, value in entry.items())
+
+# Yields the (entry, stats) of each path only once, for the files covered by several entries
+def _unique_paths(items):
+    seen = set()
+
+    for entry, stats in items:
+        path = os.path.normpath(entry['path'])
+
+        if path not in seen:
+            seen.add(path)
+            yield entry, stats
+
+# Returns (files, directories) directly inside a directory, sorted, the files along with their stats. Symlinks to directories are not followed so the walks can not loop.
+def _scan_directory(directory):
+    files = []
+    directories = []
+
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                    elif entry.is_file():
+                        files.append((entry.path, entry.stat()))
+                except OSError:
+                    continue
+    except OSError:
+        pass
+
+    return sorted(files), sorted(directories)
+
+# Yields (path, stats) of every file of a directory, and of its subdirectories if recursive, in breadth first order. Up to WALK_READ_AHEAD directories are read ahead by the threads of the walker.
+def _walk_files(walker, directory, recursive):
+    directories = deque([directory])
+    pending = deque()
+
+    while len(directories) > 0 or len(pending) > 0:
+        while len(directories) > 0 and len(pending) < WALK_READ_AHEAD:
+            pending.append(walker.submit(_scan_directory, directories.popleft()))
+
+        files, subdirectories = pending.popleft().result()
+
+        yield from files
+
+        if recursive:
+            directories.extend(subdirectories)
 
 class PortChecker(Checker):
     __pretty_name__ = 'Port Checker'
 
+    # The listening sockets are asked to the kernel through sock_diag, unless use_netlink is disabled or it is not available, in which case they are read from the /proc of the snapshot
+    def __init__(self, snapshot = None, use_netlink = True):
+        self.snapshot = snapshot if snapshot else ProcSnapshot()
+        self.use_netlink = use_netlink
+
     def analyze(self):
         open_ports = []
 
-        for connection in psutil.net_connections(kind='inet'):
-            if connection.status == psutil.CONN_LISTEN:
-                entry = {
-                    'Port': connection.laddr.port,
-                    'PID': connection.pid,
-                    'Process': psutil.Process(connection.pid).name(),
-                    'Protocol': 'TCP' if connection.type == socket.SOCK_STREAM else 'UDP'
-                }
-                open_ports.append(entry)
+        sockets = self._get_listening_sockets()
+        # Only the owners of the listening sockets are looked for
+        socket_owners = self.snapshot.get_socket_owners([inode for _, _, inode in sockets])
+
+        for protocol, port, inode in sockets:
+            pid = socket_owners[inode]
+
+            entry = {
+                'Port': port,
+                'PID': pid,
+                'Process': self.snapshot.get_process_name(pid) if pid is not None else None,
+                'Protocol': protocol
+            }
+            open_ports.append(entry)
         
         if len(open_ports):
             return [self._generate_header(open_ports)] + open_ports
         else:
             return [self._generate_header(open_ports)]
         
+    def _get_listening_sockets(self):
+        if self.use_netlink:
+            try:
+                return get_listening_sockets()
+            except OSError:
+                pass
+
+        return self.snapshot.get_listening_sockets()
+
     def _generate_header(self, collection):
         open_ports_count = len(collection)
 
@@ -176,11 +349,12 @@ class ProcessesChecker(Checker):
     __pretty_name__ = 'Processes Checker'
     isParallelizable = False
     
-    def __init__(self):
+    def __init__(self, snapshot = None):
         database_file = Constants.PATH.DATABASE.PROCESSES
         self._load_database(database_file)
 
         self._setup_lists()
+        self.snapshot = snapshot if snapshot else ProcSnapshot()
         self.running_processes = self.get_running_processes()
 
     def _setup_lists(self):
@@ -190,10 +364,6 @@ class ProcessesChecker(Checker):
         for entry in self.database:
 
             acl = entry.get('acl', None)
-            pid = entry.get('pid', None)
-            username  = entry.get('username', None)
-            name = entry.get('name', None)
-            cmd = entry.get('cmdline', None)
 
             rule = {key:value for key, value in entry.items() if key != 'acl'}
 
@@ -202,35 +372,24 @@ class ProcessesChecker(Checker):
             elif acl == 'blacklist':
                 black_list.append(rule)
         
-        self.white_list = white_list
-        self.black_list = black_list
+        self.white_list = ProcessRuleIndex(white_list)
+        self.black_list = ProcessRuleIndex(black_list)
 
     def get_running_processes(self):
-        processes = []
-         
-        for process in psutil.process_iter(['pid', 'name', 'username', 'cmdline']):
-            processes.append(process)
-        
-        return processes
+        return self.snapshot.get_processes(['pid', 'name', 'username', 'cmdline'])
     
     def analyze(self):
         blacklisted_processes = []
         whitelisted_processes = []
 
         for process in self.running_processes:
+            values = _get_process_values(process)
 
-            in_blacklist = self._check_process_in_list(process, self.black_list)
-            in_whitelist = self._check_process_in_list(process, self.white_list)
-
-            if in_blacklist is not None:
-                in_blacklist['acl'] = 'blacklist'
-                blacklisted_processes.append(in_blacklist)
+            if self.black_list.matches(values):
+                blacklisted_processes.append(self._get_process_result(process, 'blacklist'))
             
-            if in_whitelist is not None:
-                in_whitelist['acl'] = 'whitelist'
-                whitelisted_processes.append(in_whitelist)
-            
-
+            if self.white_list.matches(values):
+                whitelisted_processes.append(self._get_process_result(process, 'whitelist'))
 
         results = [self._generate_header(whitelisted_processes, blacklisted_processes)]
 
@@ -242,29 +401,16 @@ class ProcessesChecker(Checker):
 
         return results
 
-    def _check_process_in_list(self, process, checklist):
-        for entry in checklist:
-            matches = 0
-            for key, value in entry.items():
-                if key == 'cmdline':
-                    process_info = ' '.join(process.info['cmdline'])
-                else:
-                    process_info = process.info[key]
-
-                if process_info == value:
-                    matches += 1
-            if matches == len(entry):
-                result = {'acl':''}
-                for key, value in process.info.items():
-                    if key == 'cmdline':
-                        cmdline = ' '.join(process.info['cmdline'])
-                        result[key] = cmdline
-                    else:
-                        result[key] = value
-
-                return result
-            
-        return None
+    def _get_process_result(self, process, acl):
+        result = {'acl': acl}
+
+        for key, value in process.items():
+            if key == 'cmdline':
+                result[key] = ' '.join(value or [])
+            else:
+                result[key] = value
+
+        return result
 
     def _generate_header(self, whitelist, blacklist):
         whitelist_length = len(whitelist)
@@ -273,4 +419,44 @@ class ProcessesChecker(Checker):
         total_entries = len(self.running_processes)
 
         return f'#Checker: {self.__pretty_name__} #Running processes: {total_entries} #Processes in whitelist: {whitelist_length} #Processes in blacklist: {blacklist_length}'
-        
\ No newline at end of file
+        
+
+# Rules of a process list compiled into hash indexes, every rule is indexed by the value of one of its exact conditions. A process is then only checked against the rules indexed by its own values and the rules without exact conditions, instead of every rule.
+class ProcessRuleIndex:
+
+    def __init__(self, rules):
+        self.indexes = {key: {} for key in PROCESS_INDEX_KEYS}
+        self.unindexed_rules = []
+
+        for rule in rules:
+            conditions = [(key, value) for key, value in rule.items() if key not in PROCESS_PATTERN_KEYS]
+            patterns = [(PROCESS_PATTERN_KEYS[key][0], PROCESS_PATTERN_KEYS[key][1](value)) for key, value in rule.items() if key in PROCESS_PATTERN_KEYS]
+
+            index_key = next((key for key in PROCESS_INDEX_KEYS if key in rule), None)
+
+            if index_key is None:
+                self.unindexed_rules.append((conditions, patterns))
+            else:
+                self.indexes[index_key].setdefault(rule[index_key], []).append((conditions, patterns))
+
+    # Whether any rule matches the values of a process
+    def matches(self, values):
+        for key, index in self.indexes.items():
+            for rule in index.get(values.get(key, None), ()):
+                if _matches_rule(rule, values):
+                    return True
+
+        return any(_matches_rule(rule, values) for rule in self.unindexed_rules)
+
+def _matches_rule(rule, values):
+    conditions, patterns = rule
+
+    return all(values.get(key, None) == value for key, value in conditions) and all(match(values.get(key, '')) for key, match in patterns)
+
+# Values of a process as they are written in the rules
+def _get_process_values(info):
+    values = {key: value for key, value in info.items() if key != 'cmdline'}
+    values['pid'] = str(info.get('pid', None))
+    values['cmdline'] = ' '.join(info.get('cmdline', None) or [])
+
+    return values
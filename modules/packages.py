@@ -0,0 +1,241 @@
+from definitions.constants import Constants
+from utils import hash_file, check_parallel
+import errno
+import glob
+import gzip
+import os
+import re
+import stat
+
+MTREE_ESCAPE_REGEX = re.compile(rb'\\([0-7]{3})')
+
+# Base of the verifiers, the files of every package are checked by a pool of threads (hashing and reading release the interpreter lock so they use every core) and the digests are looked up in a hash cache first
+class PackageVerifier:
+
+    def __init__(self, hash_cache):
+        self.hash_cache = hash_cache
+        self.total_files = 0
+
+    def _get_digest(self, path, stats, algorithm):
+        digest = self.hash_cache.get(path, stats, algorithm)
+
+        if digest is None:
+            digest = hash_file(path, algorithm)
+            self.hash_cache.set(path, stats, algorithm, digest)
+
+        return digest
+
+# Verifies the files of the installed packages against the md5sums of dpkg and the conffiles of its status file, writing its findings like dpkg --verify does
+class DpkgVerifier(PackageVerifier):
+
+    def __init__(self, hash_cache, info_path = Constants.PATH.DPKG_INFO_PATH, status_path = Constants.PATH.DPKG_STATUS_PATH):
+        super().__init__(hash_cache)
+        self.info_path = info_path
+        self.status_path = status_path
+
+    def verify(self):
+        for result in check_parallel(self._get_files(), self._check):
+            self.total_files += 1
+
+            if result is not None:
+                yield result
+
+    # Yields (path, md5, conffile) of every packaged file
+    def _get_files(self):
+        for md5sums_path in sorted(glob.glob(os.path.join(self.info_path, '*.md5sums'))):
+            with open(md5sums_path, errors='surrogateescape') as md5sums_file:
+                for line in md5sums_file:
+                    checksum, _, path = line.rstrip('\n').partition('  ')
+                    if path:
+                        yield '/' + path, checksum, False
+
+        yield from self._get_conffiles()
+
+    # The conffiles and their original md5 are kept in the status file, for the installed packages
+    def _get_conffiles(self):
+        installed = False
+        in_conffiles = False
+        conffiles = []
+
+        with open(self.status_path, errors='surrogateescape') as status_file:
+            for line in status_file:
+                if line.startswith(' ') and in_conffiles:
+                    fields = line.split()
+                    # Obsolete conffiles and the ones not yet unpacked are not checked
+                    if len(fields) == 2 and fields[1] != 'newconffile':
+                        conffiles.append((fields[0], fields[1], True))
+                    continue
+
+                in_conffiles = line.startswith('Conffiles:')
+
+                if line.startswith('Status:'):
+                    installed = line.split()[-1] == 'installed'
+                elif line == '\n':
+                    if installed:
+                        yield from conffiles
+                    installed = False
+                    conffiles = []
+
+        if installed:
+            yield from conffiles
+
+    def _check(self, item):
+        path, checksum, conffile = item
+        attribute = 'c' if conffile else ' '
+
+        try:
+            stats = os.stat(path)
+        except OSError as error:
+            details = '' if error.errno == errno.ENOENT else f' ({error.strerror})'
+            return f'missing   {attribute} {path}{details}'
+
+        if not stat.S_ISREG(stats.st_mode):
+            return None
+
+        try:
+            digest = self._get_digest(path, stats, 'md5')
+        except OSError:
+            # Files that can not be read are not verified, like dpkg does
+            return None
+
+        if digest != checksum:
+            return f'??5?????? {attribute} {path}'
+
+        return None
+
+# Verifies the files of the installed packages against the mtree files of pacman, writing its findings like pacman -Qkk does
+class PacmanVerifier(PackageVerifier):
+
+    def __init__(self, hash_cache, local_path = Constants.PATH.PACMAN_LOCAL_PATH):
+        super().__init__(hash_cache)
+        self.local_path = local_path
+
+    def verify(self):
+        package = None
+        package_files = 0
+        altered_files = 0
+
+        for (name, path, attributes, backup), warnings in check_parallel(self._get_files(), self._check):
+            if name != package:
+                if package is not None:
+                    yield _get_pacman_summary(package, package_files, altered_files)
+                package = name
+                package_files = 0
+                altered_files = 0
+
+            self.total_files += 1
+            package_files += 1
+
+            if len(warnings) > 0:
+                altered_files += 1
+                for warning in warnings:
+                    yield f'warning: {name}: {path} ({warning})'
+
+        if package is not None:
+            yield _get_pacman_summary(package, package_files, altered_files)
+
+    # Yields (package, path, attributes, backup) of every packaged file, the attributes being the ones of its mtree entry
+    def _get_files(self):
+        for package_path in sorted(glob.glob(os.path.join(self.local_path, '*', ''))):
+            try:
+                name = self._get_name(package_path)
+                backup = self._get_backup(package_path)
+                mtree = gzip.open(os.path.join(package_path, 'mtree'), 'rb')
+            except OSError:
+                continue
+
+            with mtree:
+                defaults = {}
+
+                for line in mtree:
+                    fields = line.split()
+                    if len(fields) == 0 or fields[0].startswith(b'#'):
+                        continue
+
+                    attributes = dict(field.decode(errors='surrogateescape').partition('=')[::2] for field in fields[1:])
+
+                    if fields[0] == b'/set':
+                        defaults.update(attributes)
+                        continue
+                    elif fields[0] == b'/unset':
+                        for key in attributes:
+                            defaults.pop(key, None)
+                        continue
+
+                    path = MTREE_ESCAPE_REGEX.sub(lambda match: bytes([int(match.group(1), 8)]), fields[0]).decode(errors='surrogateescape')
+                    # The metadata of the package itself (.PKGINFO, .BUILDINFO, .MTREE...) is not installed
+                    if path.startswith('./.'):
+                        continue
+
+                    path = path[1:]
+                    yield name, path, {**defaults, **attributes}, path[1:] in backup
+
+    def _get_name(self, package_path):
+        with open(os.path.join(package_path, 'desc')) as desc_file:
+            lines = desc_file.read().split('\n')
+
+        return lines[lines.index('%NAME%') + 1]
+
+    # Backup files are expected to be modified, hence their contents are not checked
+    def _get_backup(self, package_path):
+        backup = set()
+
+        with open(os.path.join(package_path, 'files'), errors='surrogateescape') as files_file:
+            in_backup = False
+            for line in files_file:
+                line = line.rstrip('\n')
+                if line.startswith('%'):
+                    in_backup = line == '%BACKUP%'
+                elif in_backup and line:
+                    backup.add(line.split('\t')[0])
+
+        return backup
+
+    def _check(self, item):
+        name, path, attributes, backup = item
+        warnings = []
+
+        try:
+            stats = os.lstat(path)
+        except OSError as error:
+            return item, [error.strerror]
+
+        file_type = attributes.get('type', 'file')
+        expected_types = {'file': stat.S_ISREG, 'dir': stat.S_ISDIR, 'link': stat.S_ISLNK}
+        if file_type in expected_types and not expected_types[file_type](stats.st_mode):
+            return item, ['File type mismatch']
+
+        if file_type != 'link' and 'mode' in attributes and stats.st_mode & 0o7777 != int(attributes['mode'], 8):
+            warnings.append('Permissions mismatch')
+        if 'uid' in attributes and stats.st_uid != int(attributes['uid']):
+            warnings.append('UID mismatch')
+        if 'gid' in attributes and stats.st_gid != int(attributes['gid']):
+            warnings.append('GID mismatch')
+
+        if file_type == 'link' and 'link' in attributes and os.readlink(path) != attributes['link']:
+            warnings.append('Symlink path mismatch')
+
+        if file_type == 'file' and not backup:
+            if 'time' in attributes and int(stats.st_mtime) != int(float(attributes['time'])):
+                warnings.append('Modification time mismatch')
+            if 'size' in attributes and stats.st_size != int(attributes['size']):
+                warnings.append('Size mismatch')
+
+            algorithm = 'sha256' if 'sha256digest' in attributes else 'md5'
+            checksum = attributes.get(algorithm + 'digest', None)
+            if checksum is not None:
+                try:
+                    if self._get_digest(path, stats, algorithm) != checksum:
+                        warnings.append(f'{algorithm.upper()} checksum mismatch')
+                except OSError as error:
+                    warnings.append(error.strerror)
+
+        return item, warnings
+
+def _get_pacman_summary(package, total_files, altered_files):
+    total = f'{total_files} total file' + ('' if total_files == 1 else 's')
+    altered = f'{altered_files} altered file' + ('' if altered_files == 1 else 's')
+
+    return f'{package}: {total}, {altered}'
+
+VERIFIERS = {Constants.VERIFIER.DPKG: DpkgVerifier, Constants.VERIFIER.PACMAN: PacmanVerifier}
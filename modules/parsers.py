@@ -1,27 +1,77 @@
 import configparser
 from definitions.constants import Constants 
 from entities import Rule
+from modules.engine import RuleEngine
+from modules.indexes import TimestampParser, TimestampIndex
+from modules.caches import ResultCache, HashCache, get_signature
+from modules.packages import VERIFIERS
 import re
 try:
     from systemd import journal
 except ImportError:
     print('systemd module not available, please make sure to install it.')
-from datetime import datetime
-from utils import time_parser
+from datetime import datetime, timedelta
+from utils import datetime_parser, open_binary, is_compressed, is_glob, can_open, get_fingerprint, FINGERPRINT_SIZE
 import subprocess
+import threading
+import signal
+import io
+import os
+import mmap
+import glob
+import heapq
+import tempfile
+
+# Names that a rotated file might take, in order of preference
+ROTATED_EXTENSIONS = ['.1', '.1.gz', '.1.bz2', '.1.xz', '.1.zst']
+# Maximum amount of results held in memory before they are handed over
+BATCH_SIZE = 10000
+# Margin around the realtime of a journal checkpoint in which its cursor is looked for
+CURSOR_MARGIN = timedelta(seconds=1)
+# The journal window is split in up to this amount of time slices per core, none shorter than the minimum slice
+SLICES_PER_CORE = 2
+MINIMUM_SLICE = timedelta(minutes=5)
+# Seconds that the output of a killed command is still read for
+KILL_GRACE_PERIOD = 1
+# Seconds that the cached results of a command are reused for by default
+DEFAULT_CACHE_TTL = 24 * 60 * 60
 
 # This parser essentially gets information from a source (file) and for each line it parses its result agains each of the rules
 class GenericParser:
     __pretty_name__ = 'Generic Parser'
     isParallelizable = True
+    # Whether the source can be split in several files and chunks to be parsed in parallel
+    isSplittable = True
+    # When set, the source is split in chunks of approximately this amount of bytes which are parsed in parallel
+    chunk_size = None
+    # When set, the source is memory mapped and only the lines that could match a rule are decoded and parsed
+    use_mmap = False
+    # Set by resume, the segments of the sources to parse and the checkpoint reached after parsing them
+    segments = None
+    checkpoint = None
+    # When the lines of the source start with a timestamp, the Since and Until of the rules are applied and a timestamp index of each file is kept in the state path to only read the lines inside their windows
+    timestamp_parser = None
+    state_path = Constants.PATH.DEFAULT_STATE_PATH
 
-    def __init__(self, rules_path, scope, source = None):
+    def __init__(self, rules_path, scope, source = None, chunk_size = None, use_mmap = False, timestamp_format = None, state_path = None):
         self.rules_path = rules_path
         self.scope = scope
 
         if source:
             self.source = source
 
+        if chunk_size:
+            self.chunk_size = chunk_size
+
+        if use_mmap:
+            self.use_mmap = use_mmap
+
+        if timestamp_format:
+            self.timestamp_parser = TimestampParser(timestamp_format)
+
+        if state_path:
+            self.state_path = state_path
+
         #Load and initialize rules
         self.load_rules()
 
@@ -38,57 +88,418 @@ class GenericParser:
             until = rules_file.get(section, Constants.RULE_FIELD.UNTIL, fallback=None)
             filters = rules_file.get(section, Constants.RULE_FIELD.FILTERS, fallback=None)
             regex = rules_file.get(section, Constants.RULE_FIELD.REGEX, fallback=None)
-            rule = Rule(id, rule_type, since, until, filters, regex)
+            fields = rules_file.get(section, Constants.RULE_FIELD.FIELDS, fallback=None)
+            rule = Rule(id, rule_type, since, until, filters, regex, fields)
             rule_list.append(rule)
         self.rules = rule_list
+        self.engine = RuleEngine(rule_list)
+        self._setup_time_windows()
+
+    # rule id ==> (since, until) in seconds since the epoch, None when unbounded. They are only used when the source has a timestamp format and a rule has a Since or Until.
+    def _setup_time_windows(self):
+        self.time_windows = None
+
+        if self.timestamp_parser is None or all(rule.since is None and rule.until is None for rule in self.rules):
+            return
+
+        now = datetime.now()
+        self.time_windows = {}
+
+        for rule in self.rules:
+            since = datetime_parser(rule.since, now)
+            until = datetime_parser(rule.until, now)
+            self.time_windows[rule.id] = (since.timestamp() if since else None, until.timestamp() if until else None)
+
+        # Window of the whole source, from the earliest Since to the latest Until
+        windows = self.time_windows.values()
+        since = None if any(window[0] is None for window in windows) else min(window[0] for window in windows)
+        until = None if any(window[1] is None for window in windows) else max(window[1] for window in windows)
+        self.source_window = (since, until)
 
     def parse(self):
+        return self.merge_chunks([self.parse_chunk(*segment) for segment in self.get_segments()])
+
+    # Yields the results of the lines in batches, so they never need to be held in memory all at once. The total of entries is the return value of the generator.
+    def _stream_lines(self, lines):
+        batch = []
+        total_entries = 0
+
+        for line in lines:
+            total_entries += 1 
+            
+            result = self._parse_entry(line)
+            if result:
+                batch += result
+                if len(batch) >= BATCH_SIZE:
+                    yield batch
+                    batch = []
+
+        if len(batch) > 0:
+            yield batch
+
+        return total_entries
+
+    # Segments (path, start, end) of the sources to parse, by default every file of the source. An end of None means until the end of the file.
+    def get_segments(self):
+        if self.segments is None:
+            return [self._get_window_segment(path, 0, None) for path in self.get_paths()]
+
+        return self.segments
+
+    # The source can be a glob, its files are parsed from the oldest to the newest so the results keep the order in which they were logged
+    def get_paths(self):
+        if not is_glob(self.source):
+            return [self.source]
+
+        paths = [path for path in glob.glob(self.source) if os.path.isfile(path) and can_open(path)]
+
+        return sorted(paths, key=lambda path: (os.path.getmtime(path), path))
+
+    # Decides which data of the source is new since the given checkpoint and returns the checkpoint to store once it has been parsed. The checkpoint of a file keeps its inode, the offset after the last parsed line and a fingerprint of its first bytes, if the file was rotated the remaining data of its predecessor (.1 or compressed .1) is parsed too. The files of a glob are recognized by their inode, so they are not parsed again when they are renamed by the rotation, and the compressed ones by the fingerprint of their data, so they are not parsed again when they are compressed by it.
+    def resume(self, checkpoint):
+        self.segments = []
+
+        if not is_glob(self.source):
+            try:
+                self.checkpoint = self._resume_file(self.source, checkpoint, True)
+            except FileNotFoundError:
+                self.checkpoint = None
+
+            return self.checkpoint
+
+        previous_checkpoints = {}
+        if checkpoint:
+            for file_checkpoint in checkpoint['files'].values():
+                previous_checkpoints[file_checkpoint['inode']] = file_checkpoint
+
+        self.checkpoint = {'files': {}}
+
+        inodes = {}
+        for path in self.get_paths():
+            try:
+                inodes[path] = os.stat(path).st_ino
+            except FileNotFoundError:
+                continue
+
+        # A file compressed by the rotation gets a new inode, it may be the copy of any of the previous files. The ones that are gone are tried first, but every one is a candidate since the inode of a file that is gone may already be reused by a new file.
+        previous_files = sorted(previous_checkpoints.values(), key=lambda file_checkpoint: file_checkpoint['inode'] in inodes.values())
+
+        for path, inode in inodes.items():
+            try:
+                if is_compressed(path):
+                    self.checkpoint['files'][path] = self._resume_compressed_file(path, previous_checkpoints.get(inode, None), previous_files)
+                else:
+                    self.checkpoint['files'][path] = self._resume_file(path, previous_checkpoints.get(inode, None), False)
+            except FileNotFoundError:
+                continue
+
+        return self.checkpoint
+
+    def _resume_file(self, path, checkpoint, find_predecessor):
+        if is_compressed(path):
+            return self._resume_compressed_file(path, checkpoint, [])
+
+        stats = os.stat(path)
+
+        with open(path, 'rb') as file:
+            head = file.read(FINGERPRINT_SIZE)
+
+            if checkpoint and checkpoint['inode'] == stats.st_ino and checkpoint.get('offset', stats.st_size + 1) <= stats.st_size and get_fingerprint(head, checkpoint['length']) == checkpoint['fingerprint']:
+                start = checkpoint['offset']
+            else:
+                start = 0
+                if find_predecessor:
+                    self.segments += [self._get_window_segment(*segment) for segment in self._get_predecessor_segments(path, checkpoint)]
+
+            end = self._get_safe_end(file, start, stats.st_size)
+
+        path, window_start, window_end = self._get_window_segment(path, start, end)
+        self.segments.append((path, window_start, window_end))
+        # Lines after the window are left for the next runs
+        end = window_end
+
+        length = min(FINGERPRINT_SIZE, end)
+
+        return {'inode': stats.st_ino, 'offset': end, 'fingerprint': get_fingerprint(head, length), 'length': length}
+
+    # Compressed files are not written anymore, hence they are only parsed once. When a compressed file is new, the fingerprint of its decompressed data is compared with the checkpoints of the previous files: if it is a compressed copy of one of them (like logrotate does with delaycompress) only the data after the offset reached in that file is parsed.
+    def _resume_compressed_file(self, path, checkpoint, previous_files):
+        stats = os.stat(path)
+
+        try:
+            with open_binary(path) as file:
+                head = file.read(FINGERPRINT_SIZE)
+        except (OSError, EOFError):
+            head = b''
+
+        file_checkpoint = {'inode': stats.st_ino, 'size': stats.st_size, 'fingerprint': get_fingerprint(head, len(head)), 'length': len(head)}
+
+        if checkpoint and checkpoint['inode'] == stats.st_ino and checkpoint.get('size', None) == stats.st_size:
+            return file_checkpoint
+
+        for previous_file in previous_files:
+            if 'fingerprint' in previous_file and get_fingerprint(head, previous_file['length']) == previous_file['fingerprint']:
+                previous_files.remove(previous_file)
+
+                # A compressed file that was parsed whole is just compressed again
+                if 'offset' in previous_file:
+                    self.segments.append((path, previous_file['offset'], None))
+
+                return file_checkpoint
+
+        self.segments.append((path, 0, None))
+
+        return file_checkpoint
+
+    def _get_predecessor_segments(self, source, checkpoint):
+        if not checkpoint or 'offset' not in checkpoint:
+            return []
+
+        for extension in ROTATED_EXTENSIONS:
+            path = source + extension
+
+            try:
+                stats = os.stat(path)
+                with open_binary(path) as file:
+                    head = file.read(FINGERPRINT_SIZE)
+            except (OSError, EOFError):
+                continue
+
+            if (extension == '.1' and stats.st_ino == checkpoint['inode']) or get_fingerprint(head, checkpoint['length']) == checkpoint['fingerprint']:
+                return [(path, checkpoint['offset'], None)]
+
+        return []
+
+    # Narrows a segment (path, start, end) of a file to the window of the rules through the timestamp index of the file, compressed files can not be narrowed
+    def _get_window_segment(self, path, start, end):
+        if self.time_windows is None or is_compressed(path):
+            return path, start, end
+
+        index = TimestampIndex(path, self.timestamp_parser, self.state_path)
+        start, end = index.get_range(self.source_window[0], self.source_window[1], start, end)
+
+        return path, start, end
+
+    # Returns the offset right after the last complete line, a line still being written is left for the next run
+    def _get_safe_end(self, file, start, end):
+        if end <= start:
+            return start
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return buffer.rfind(b'\n', start, end) + 1 or start
+
+    # Splits the segments in byte ranges (path, start, end) whose boundaries are always at the start of a line when a chunk size is set, compressed segments can not be split
+    def get_chunks(self):
+        chunks = []
+
+        for path, start, end in self.get_segments():
+            if self.chunk_size is None or is_compressed(path):
+                chunks.append((path, start, end))
+                continue
+
+            if end is None:
+                end = os.path.getsize(path)
+            boundaries = [start]
+
+            with open(path, 'rb') as file:
+                while boundaries[-1] + self.chunk_size < end:
+                    boundary = self._get_boundary(file, boundaries[-1] + self.chunk_size)
+                    if boundary >= end:
+                        break
+                    boundaries.append(boundary)
+
+            boundaries.append(end)
+
+            for chunk_start, chunk_end in zip(boundaries[:-1], boundaries[1:]):
+                chunks.append((path, chunk_start, chunk_end))
+
+        return chunks
+
+    # Returns the offset of the first line starting at or after the given offset
+    def _get_boundary(self, file, offset):
+        file.seek(offset - 1)
+        file.readline()
+
+        return file.tell()
+
+    # Parses a single chunk of a source, the output and the total entries of every chunk are then combined with merge_chunks
+    def parse_chunk(self, path, start, end):
         output = []
+        total_entries = _drain(self._stream_range(path, start, end), output.extend)
+
+        return path, output, total_entries
+
+    # Same as parse_chunk but the output is written to a spool file instead of being returned, so the memory used does not depend on the amount of matches. The spool files of every chunk are then combined with merge_spools.
+    def spool_chunk(self, path, start, end):
+        matched_entries = 0
+
+        batches = self._stream_range(path, start, end)
+
+        with tempfile.NamedTemporaryFile('w', prefix='systell_', suffix='.spool', delete=False) as spool_file:
+            while True:
+                try:
+                    batch = next(batches)
+                except StopIteration as stop:
+                    total_entries = stop.value
+                    break
+
+                matched_entries += len(batch)
+                spool_file.writelines(item + '\n' for item in batch)
+
+        return path, spool_file.name, matched_entries, total_entries
+
+    def _stream_range(self, path, start, end):
+        if is_compressed(path):
+            with open_binary(path) as file:
+                file.seek(start)
+                return (yield from self._stream_lines(io.TextIOWrapper(file)))
+
+        if self.use_mmap and self.engine.line_pattern is not None:
+            if end is None:
+                end = os.path.getsize(path)
+            return (yield from self._scan_buffer(path, start, end))
+
+        if start == 0 and end is None:
+            with open(path, 'r') as file:
+                return (yield from self._stream_lines(file))
+
+        with open(path, 'rb') as file:
+            file.seek(start)
+            return (yield from self._stream_lines(_read_lines(file, end)))
+
+    # Parses the byte range of the source through a memory map. Lines are only decoded when they contain a literal of a rule, undecodable bytes are replaced instead of aborting, and the lines are counted by counting the newline bytes.
+    def _scan_buffer(self, path, start, end):
+        batch = []
+
+        if end <= start:
+            return 0
+
+        with open(path, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                total_entries = self._count_lines(buffer, start, end)
+                position = start
+
+                while True:
+                    match = self.engine.line_pattern.search(buffer, position, end)
+                    if match is None:
+                        break
+
+                    line_start = buffer.rfind(b'\n', start, match.start()) + 1
+                    if line_start == 0:
+                        line_start = start
+
+                    line_end = buffer.find(b'\n', match.end(), end) + 1
+                    if line_end == 0:
+                        line_end = end
+
+                    line = buffer[line_start:line_end]
+                    # Same newline translation as the text mode
+                    if line.endswith(b'\r\n'):
+                        line = line[:-2] + b'\n'
+
+                    result = self._parse_entry(line.decode(errors='replace'))
+                    if result:
+                        batch += result
+                        if len(batch) >= BATCH_SIZE:
+                            yield batch
+                            batch = []
+
+                    position = line_end
+
+        if len(batch) > 0:
+            yield batch
+
+        return total_entries
+
+    def _count_lines(self, buffer, start, end):
+        block_size = 16 * 1024 ** 2
         total_entries = 0
 
-        with open(self.source, 'r') as file:
-            for line in file:
-                total_entries += 1 
-                
-                result = self._parse_entry(line)
-                if result:
-                    for item in result:
-                        output.append(item)
-        
+        for offset in range(start, end, block_size):
+            total_entries += buffer[offset:min(offset + block_size, end)].count(b'\n')
+
+        # The last line might not end with a newline
+        if buffer[end - 1:end] != b'\n':
+            total_entries += 1
+
+        return total_entries
+
+    def merge_chunks(self, results):
+        output = []
+        total_entries = 0
+        # path ==> [total entries, matched entries]
+        files = {}
+
+        for path, chunk_output, chunk_entries in results:
+            output += chunk_output
+            total_entries += chunk_entries
+
+            file_entries = files.setdefault(path, [0, 0])
+            file_entries[0] += chunk_entries
+            file_entries[1] += len(chunk_output)
+
+        # The files of a glob are detailed in the header
+        if not is_glob(self.source):
+            files = None
+
         if len(output) > 0:
-            output = [self._generate_header(output, total_entries)] + output
+            output = [self._generate_header(output, total_entries, files)] + output
         else:
-            output = [self._generate_header(output, total_entries)]
-            
+            output = [self._generate_header(output, total_entries, files)]
+
         return output
     
-    def _generate_header(self, collection, total_entries):
-        matched_entries = str(len(collection))
+    # Combines the results of spool_chunk, returning the header of the source and the spool files holding its output in order
+    def merge_spools(self, results):
+        spools = []
+        matched_entries = 0
+        total_entries = 0
+        # path ==> [total entries, matched entries]
+        files = {}
+
+        for path, spool, chunk_matched, chunk_entries in results:
+            spools.append(spool)
+            matched_entries += chunk_matched
+            total_entries += chunk_entries
+
+            file_entries = files.setdefault(path, [0, 0])
+            file_entries[0] += chunk_entries
+            file_entries[1] += chunk_matched
+
+        # The files of a glob are detailed in the header
+        if not is_glob(self.source):
+            files = None
+
+        return self._generate_header(matched_entries, total_entries, files), spools
+
+    # The matched entries can be given either as the collection of results or as their amount
+    def _generate_header(self, collection, total_entries, files = None):
+        matched_entries = str(collection if isinstance(collection, int) else len(collection))
         rule_count = str(len(self.rules))
 
-        return f'#Parser: {self.__pretty_name__} #Total entries: {total_entries} #Matched entries: {matched_entries} #Rule count: {rule_count} Resource: {self.source.split("/")[-1]}'
+        header = f'#Parser: {self.__pretty_name__} #Total entries: {total_entries} #Matched entries: {matched_entries} #Rule count: {rule_count} Resource: {self.source.split("/")[-1]}'
+
+        if files is not None:
+            breakdown = ', '.join(f'{path.split("/")[-1]} ({entries[0]} entries, {entries[1]} matched)' for path, entries in files.items())
+            header += f' #Files: {len(files)} [{breakdown}]'
+
+        return header
 
     def _parse_entry(self, entry):
         output = []
 
-        for rule in self.rules:
-            match = None
-
-            if rule.rule_type == Constants.RULE_TYPE.REGEX:
-                match = re.search(rule.regex, entry)
-            elif rule.rule_type == Constants.RULE_TYPE.FILTERED:
-                if all(filter in entry for filter in rule.filters):
-                    #If not done what follows, when using the rule id on the regex it will fail if the rule id contains the spaces, hence we remove them
-                    id_without_spaces = rule.id.replace(' ', '')
-                    match = re.search('(?P<' + id_without_spaces + '>.*)', entry)
-            else:
-                if all(filter in entry for filter in rule.filters):
-                    match = re.search(rule.regex, entry)
+        matches = self.engine.match(entry)
+
+        # The timestamp is only parsed for the entries that matched, entries without a timestamp are not filtered by time
+        timestamp = None
+        if self.time_windows is not None and len(matches) > 0:
+            timestamp = self.timestamp_parser.parse(entry)
+
+        for rule, match in matches:
+            if timestamp is not None and not _in_window(self.time_windows[rule.id], timestamp):
+                continue
 
-            if match and isinstance(match, re.Match):
-                output.append(rule.id + ' ==> ' + str(match.groupdict()))
-            elif match:
-                output.append(rule.id + ' ==> ' +str(match))
+            output.append(rule.id + ' ==> ' + str(match))
 
         return output
 
@@ -98,104 +509,203 @@ class GenericParser:
 class GenericBlockParser(GenericParser):
     __pretty_name__ = 'Aptitude Logs Parser'
 
-    def __init__(self, rules_path, scope, start_delimiter, end_delimiter, source = None):
-        super().__init__(rules_path, scope, source)
+    def __init__(self, rules_path, scope, start_delimiter, end_delimiter, source = None, chunk_size = None, timestamp_format = None, state_path = None):
+        super().__init__(rules_path, scope, source, chunk_size, timestamp_format=timestamp_format, state_path=state_path)
         self.start_delimiter = start_delimiter
         self.end_delimiter = end_delimiter
 
-    def parse(self):
-        output = []
+    def _stream_lines(self, lines):
+        batch = []
         block_started = False
         block = []
         total_entries = 0
 
-        with open(self.source, 'r') as file:            
-            for line in file:
-                total_entries += 1 
-                
-                if line.startswith(self.start_delimiter):
-                    block_started = True
-                elif line.startswith(self.end_delimiter):
-                    block.append(line)
-                    block_started = False
-                
-                if block_started:
-                    block.append(line)
-                else:
-                    if len(block) > 0:
-                        line = ' '.join(block).replace('\n', '')
-                        block = []
-                        
-                        result = self._parse_entry(line)
-                        if result:
-                            for item in result:
-                                output.append(item)
-                                
-        if len(output) > 0:
-            output = [self._generate_header(output, total_entries)] + output
-        else:
-            output = [self._generate_header(output, total_entries)]
+        for line in lines:
+            total_entries += 1 
             
-        return output
+            if line.startswith(self.start_delimiter):
+                block_started = True
+            elif line.startswith(self.end_delimiter):
+                block.append(line)
+                block_started = False
+            
+            if block_started:
+                block.append(line)
+            else:
+                if len(block) > 0:
+                    line = ' '.join(block).replace('\n', '')
+                    block = []
+                    
+                    result = self._parse_entry(line)
+                    if result:
+                        batch += result
+                        if len(batch) >= BATCH_SIZE:
+                            yield batch
+                            batch = []
+
+        if len(batch) > 0:
+            yield batch
+
+        return total_entries
 
-# This parser is very different to the GenericParserInterface. Key points on this class are: it creates a reader for each rule and then configures the reader according to the rule information (Until, Since, Filters, etc), then for each reader it parses each entry against the rule associated with the reader.
+    # Chunks must never split a block, hence a boundary is moved to the first start delimiter that follows an end delimiter, at that point no block is open
+    def _get_boundary(self, file, offset):
+        offset = super()._get_boundary(file, offset)
+        start_delimiter = self.start_delimiter.encode()
+        end_delimiter = self.end_delimiter.encode()
+        block_ended = False
+
+        file.seek(offset)
+        while True:
+            offset = file.tell()
+            line = file.readline()
+
+            if not line:
+                return offset
+            
+            if line.startswith(start_delimiter):
+                if block_ended:
+                    return offset
+            elif line.startswith(end_delimiter):
+                block_ended = True
+
+    # Returns the offset right after the last complete end delimiter line, at that point no block is open
+    def _get_safe_end(self, file, start, end):
+        if end <= start:
+            return start
+
+        start_delimiter = self.start_delimiter.encode()
+        end_delimiter = self.end_delimiter.encode()
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            position = end
+
+            while True:
+                # The range always starts at the beginning of a line, so the newline before it can be used too
+                index = buffer.rfind(b'\n' + end_delimiter, max(start - 1, 0), position)
+
+                if index == -1 and start == 0 and buffer[:len(end_delimiter)] == end_delimiter:
+                    line_start = 0
+                elif index == -1:
+                    break
+                else:
+                    line_start = index + 1
+
+                line_end = buffer.find(b'\n', line_start, end)
+
+                if line_end != -1 and buffer[line_start:line_start + len(start_delimiter)] != start_delimiter:
+                    return line_end + 1
+
+                if line_start == 0:
+                    break
+                position = index
+
+        return start
+
+# This parser is very different to the GenericParserInterface. Key points on this class are: a reader is opened over the union of the matches of the rules that have matches, and another one for the rules without matches, each positioned at the earliest Since of its rules. Their entries are merged in chronological order and each entry is read once and handed over to every rule whose time window and filters it satisfies. The window can be split in time slices, each read by its own reader, which are parsed in parallel and merged back in order.
 class JournalLogParser(GenericParser):
     __pretty_name__ = 'Journal Logs Parser'
-    isParallelizable = False
+    isParallelizable = True
+    isSplittable = True
 
     def __init__(self, rules_path, scope):
         super().__init__(rules_path, scope, 'journal')
         
     def load_rules(self):
         super().load_rules()
-        self._setup_readers()
+        self._setup_windows()
 
-    def _setup_readers(self):
-        self.readers = []
-        for rule in self.rules:
-            reader = journal.Reader()
-            if rule.rule_type != Constants.RULE_TYPE.REGEX:
-                if len(rule.filters) > 0:
-                    for filter in rule.filters:
-                        reader.add_match(filter)
-                else:
-                    #If no filter was specified, watch all priorities
-                    reader.add_match('PRIORITY=0')
-                    reader.add_match('PRIORITY=1')
-                    reader.add_match('PRIORITY=2')
-                    reader.add_match('PRIORITY=3')
-                    reader.add_match('PRIORITY=4')
-                    reader.add_match('PRIORITY=5')
-                    reader.add_match('PRIORITY=6')
-                    reader.add_match('PRIORITY=7')
-
-            if rule.since and rule.since[0] == '-':
-                time = time_parser(rule.since)
-                reader.seek_realtime(datetime.now() - time)
-            elif rule.since:
-                reader.seek_realtime(datetime.strptime(rule.since, '%Y-%m-%d %H:%M:%S'))
-            else:
-                #If no since option was specified, default to 1 hour
-                reader.seek_realtime(datetime.now() - timedelta(hours=1))
+    def _setup_windows(self):
+        now = datetime.now()
+        self.windows = [JournalRuleWindow(rule, now) for rule in self.rules]
+
+    # The checkpoint keeps the cursor of the last entry parsed by each rule, a rule continues from it as long as it is inside its Since window
+    def resume(self, checkpoint):
+        self.checkpoint = dict(checkpoint) if checkpoint else {}
+
+        for window in self.windows:
+            rule_checkpoint = self.checkpoint.get(window.rule.id, None)
+
+            if rule_checkpoint and rule_checkpoint['realtime'] >= window.since.timestamp():
+                window.resume_time = datetime.fromtimestamp(rule_checkpoint['realtime'])
+                window.skip_cursor = rule_checkpoint['cursor']
+
+        return self.checkpoint
+
+    # The filters of different rules can not be simply added, the journal would require an entry to satisfy all of them at once, so the matches of each rule are a disjunction. Rules without matches need every entry, so they get a reader of their own and the rules with matches keep reading only their entries.
+    def _get_reader_groups(self):
+        indexed = [window for window in self.windows if len(window.matches) > 0]
+        unindexed = [window for window in self.windows if len(window.matches) == 0]
+
+        return [windows for windows in (indexed, unindexed) if len(windows) > 0]
+
+    def _setup_reader(self, windows, start):
+        reader = journal.Reader()
+
+        for window in windows:
+            for field, values in window.matches.items():
+                for value in values:
+                    reader.add_match(field + '=' + value)
+            reader.add_disjunction()
+
+        reader.seek_realtime(start)
+
+        return reader
+
+    def _get_start(self, windows):
+        return min(window.get_start() for window in windows)
+
+    # Entries are read in chronological order, none can be inside a window once past the latest Until
+    def _get_latest_until(self, windows):
+        if any(window.until is None for window in windows):
+            return None
+
+        return max(window.until for window in windows)
+
+    # Yields (timestamp, index, entry) of the entries of the group of windows at the index, logged from start (included) until end (excluded). Each reader starts at the earliest Since of its own windows.
+    def _read_group(self, index, windows, start, end):
+        latest_until = self._get_latest_until(windows)
+        group_start = self._get_start(windows)
+
+        for entry in self._setup_reader(windows, max(start, group_start) if start else group_start):
+            timestamp = entry['__REALTIME_TIMESTAMP']
+            if (end is not None and timestamp >= end) or (latest_until is not None and timestamp > latest_until):
+                break
 
-            #To associate each reader with its corresponding rule.
-            reader.rule = rule
+            yield timestamp, index, entry
 
-            self.readers.append(reader)
+    # Yields (entry, windows) of every entry read in chronological order, along with the windows it must be checked against in the order of the rules file. An entry read by several readers is only yielded once, the readers are merged by timestamp so its copies share the same one.
+    def _read_entries(self, start, end):
+        groups = self._get_reader_groups()
+        readers = [self._read_group(index, windows, start, end) for index, windows in enumerate(groups)]
+        # cursor ==> (entry, indexes of the groups that read it) of the entries with the current timestamp
+        pending = {}
+        current = None
+
+        for timestamp, index, entry in heapq.merge(*readers, key=lambda item: item[0]):
+            if timestamp != current:
+                yield from self._flush_entries(pending, groups)
+                pending = {}
+                current = timestamp
+
+            pending.setdefault(entry['__CURSOR'], (entry, []))[1].append(index)
+
+        yield from self._flush_entries(pending, groups)
+
+    def _flush_entries(self, pending, groups):
+        for entry, indexes in pending.values():
+            if len(indexes) == 1:
+                yield entry, groups[indexes[0]]
+            else:
+                yield entry, [window for window in self.windows if any(window in groups[index] for index in indexes)]
 
     def parse(self):
         output = []
 
-        total_entries = 0
-
-        for reader in self.readers:    
-            for entry in reader:
-                total_entries += 1
+        total_entries = _drain(self._stream_range(self.source, None, None), output.extend)
 
-                result = self._parse_entry(entry, reader.rule)
-                if result:
-                    for item in result:
-                        output.append(item)
+        if self.checkpoint is not None:
+            self.checkpoint.update(self._get_rule_checkpoints())
 
         if len(output) > 0:
             output = [self._generate_header(output, total_entries)] + output
@@ -203,34 +713,93 @@ class JournalLogParser(GenericParser):
             output = [self._generate_header(output, total_entries)]
 
         return output
-    
-    def _parse_entry(self, entry, rule):
-        output = []
-        match = None
 
-        if rule.until:
-            timezone = entry['__REALTIME_TIMESTAMP'].tzinfo
-            
-            if rule.until[0] == '-':
-                time = time_parser(rule.until)
-                time = datetime.now(timezone) - time
-            elif rule.until == 'NOW':
-                time = None
-            else:
-                time = datetime.strptime(rule.until, '%Y-%m-%d %H:%M:%S')
-        
-        #If a time to define until when to filter exists, and an entry is found that exceeds this time, then skip this rule
-        if time and entry['__REALTIME_TIMESTAMP'] > time:
-            return output
-
-        if rule.rule_type == Constants.RULE_TYPE.REGEX:
-            match = re.search(rule.regex, str(entry))
-        elif rule.rule_type == Constants.RULE_TYPE.FILTERED:
-            #If not done what follows, when using the rule id on the regex it will fail if the rule id contains the spaces, hence we remove them
-            id_without_spaces = rule.id.replace(' ', '')
-            match = re.search('(?P<' + id_without_spaces + '>.*)', entry['MESSAGE'])
-        else:
-            match = re.search(rule.regex, entry['MESSAGE'])
+    # Splits the window of the rules in time slices (source, start, end), there are a few slices per core so the work is spread even when the entries are not. A start or end of None means the start or the end of the window.
+    def get_chunks(self):
+        if len(self.windows) == 0:
+            return [(self.source, None, None)]
+
+        start = self._get_start(self.windows)
+        end = self._get_latest_until(self.windows) or datetime.now()
+
+        slice_count = max(1, min((os.cpu_count() or 1) * SLICES_PER_CORE, int((end - start) / MINIMUM_SLICE)))
+        step = (end - start) / slice_count
+        boundaries = [start + step * index for index in range(1, slice_count)]
+
+        # A rule resuming from a checkpoint needs to see its cursor, so no slice starts right next to it
+        boundaries = [boundary for boundary in boundaries if all(window.resume_time is None or abs(boundary - window.resume_time) > CURSOR_MARGIN for window in self.windows)]
+
+        boundaries = [None] + boundaries + [None]
+
+        return [(self.source, slice_start, slice_end) for slice_start, slice_end in zip(boundaries[:-1], boundaries[1:])]
+
+    # Besides the spool, returns the checkpoint reached by each rule in the slice
+    def spool_chunk(self, path, start, end):
+        return super().spool_chunk(path, start, end) + (self._get_rule_checkpoints(),)
+
+    # The slices are merged in order, so the checkpoint of a rule ends up being the one of the latest slice it parsed an entry in
+    def merge_spools(self, results):
+        for result in results:
+            if self.checkpoint is not None:
+                self.checkpoint.update(result[4])
+
+        return super().merge_spools([result[:4] for result in results])
+
+    # Parses the entries logged from start (included) until end (excluded)
+    def _stream_range(self, path, start, end):
+        batch = []
+        total_entries = 0
+
+        if len(self.windows) == 0:
+            return total_entries
+
+        for entry, windows in self._read_entries(start, end):
+            timestamp = entry['__REALTIME_TIMESTAMP']
+            total_entries += 1
+            formatted_entry = None
+
+            for window in windows:
+                if not window.contains(entry, timestamp):
+                    continue
+
+                if len(window.rule.fields) > 0:
+                    text = window.project(entry)
+                elif window.rule.rule_type == Constants.RULE_TYPE.REGEX:
+                    # Rules that do not declare their fields match on the whole entry, it is formatted only once for all of them
+                    if formatted_entry is None:
+                        formatted_entry = str(entry)
+                    text = formatted_entry
+                else:
+                    text = entry['MESSAGE']
+
+                result = self._parse_entry(text, window.rule)
+                if result:
+                    batch += result
+                    if len(batch) >= BATCH_SIZE:
+                        yield batch
+                        batch = []
+
+                window.last_entry = entry
+
+        if len(batch) > 0:
+            yield batch
+
+        return total_entries
+
+    # Entries after Until are left for the next runs
+    def _get_rule_checkpoints(self):
+        checkpoints = {}
+
+        for window in self.windows:
+            if window.last_entry is not None:
+                checkpoints[window.rule.id] = {'cursor': window.last_entry['__CURSOR'], 'realtime': window.last_entry['__REALTIME_TIMESTAMP'].timestamp()}
+
+        return checkpoints
+
+    # The text is the part of the entry the rule matches on
+    def _parse_entry(self, text, rule):
+        output = []
+        match = rule.pattern.search(text)
 
         if match and isinstance(match, re.Match):
             output.append(rule.id + ' ==> ' + str(match.groupdict()))
@@ -239,32 +808,253 @@ class JournalLogParser(GenericParser):
         
         return output
 
+# Time window and journal matches of a rule, they are computed once so checking an entry against the rule does not parse any time nor filter
+class JournalRuleWindow:
+
+    def __init__(self, rule, now):
+        self.rule = rule
+        # field ==> values, like the journal an entry needs one of the values of every field
+        self.matches = {}
+
+        if rule.rule_type != Constants.RULE_TYPE.REGEX:
+            filters = rule.filters
+            if len(filters) == 0:
+                #If no filter was specified, watch all priorities
+                filters = ['PRIORITY=' + str(priority) for priority in range(8)]
+
+            for filter in filters:
+                field, value = filter.split('=', 1)
+                self.matches.setdefault(field, set()).add(value)
+
+        self.since = datetime_parser(rule.since, now)
+        if self.since is None:
+            #If no since option was specified, default to 1 hour
+            self.since = now - timedelta(hours=1)
+
+        self.until = datetime_parser(rule.until, now)
+
+        # Set by resume, the rule skips every entry until the one of its checkpoint cursor
+        self.resume_time = None
+        self.skip_cursor = None
+        self.last_entry = None
+
+    def get_start(self):
+        if self.resume_time is not None:
+            # The realtime of the checkpoint is rounded, the reader starts slightly earlier so the cursor is not missed
+            return self.resume_time - CURSOR_MARGIN
+
+        return self.since
+
+    def contains(self, entry, timestamp):
+        if timestamp < self.since or (self.until is not None and timestamp > self.until):
+            return False
+
+        if self.skip_cursor is not None:
+            if entry['__CURSOR'] == self.skip_cursor:
+                self.skip_cursor = None
+                return False
+            if timestamp <= self.resume_time + CURSOR_MARGIN:
+                return False
+            # The entry of the cursor is gone, for instance because the journal was vacuumed
+            self.skip_cursor = None
+
+        # An entry without a declared field is skipped before anything is formatted
+        for field in self.rule.fields:
+            if field not in entry:
+                return False
+
+        for field, values in self.matches.items():
+            value = entry.get(field, None)
+
+            # A field present several times in the entry is a list of values
+            if isinstance(value, list):
+                if not any(str(item) in values for item in value):
+                    return False
+            elif value is None or str(value) not in values:
+                return False
+
+        return True
+
+    # Compact projection of the declared fields of the entry, one FIELD=value line per value in the order they were declared
+    def project(self, entry):
+        lines = []
+
+        for field in self.rule.fields:
+            value = entry[field]
+            # A field present several times in the entry is a list of values
+            for item in value if isinstance(value, list) else [value]:
+                lines.append(field + '=' + str(item))
+
+        return '\n'.join(lines)
+
 class GenericCommandParser(GenericParser):
     __pretty_name__ = 'Generic Command Output Parser'
     isParallelizable = True
+    isSplittable = False
+    # When set, the command is killed after this amount of seconds and the results parsed until then are reported
+    timeout = None
+    # When set, the results are cached in the state path and reused while these paths and the rules file are unchanged, for up to cache_ttl seconds. Without use_cache the command is always executed but its results are still cached.
+    dependencies = None
+    cache_ttl = DEFAULT_CACHE_TTL
+    use_cache = True
+
+    def __init__(self, rules_path, scope, source = None, timeout = None, dependencies = None, cache_ttl = None, use_cache = True, state_path = None):
+        super().__init__(rules_path, scope, source, state_path=state_path)
+
+        if timeout:
+            self.timeout = timeout
+
+        if dependencies:
+            self.dependencies = dependencies
+
+        if cache_ttl is not None:
+            self.cache_ttl = cache_ttl
+
+        self.use_cache = use_cache
+
+    # The output of a command is always parsed completely
+    def resume(self, checkpoint):
+        self.checkpoint = None
+
+        return self.checkpoint
+
+    def parse(self):
+        if self.dependencies is None:
+            return self._execute()[0]
 
-    def _get_checks(self):
-        command_output = subprocess.run(self.source, shell=True, capture_output=True, text=True)
+        cache = ResultCache(self.state_path)
+        key = f'{self.source}:{self.rules_path}'
+        # Computed before executing the command, so changes made while it runs invalidate the results
+        signature = get_signature(self.dependencies + [self.rules_path])
 
-        output = command_output.stdout.split('\n')[0:-1] + command_output.stderr.split('\n')[0:-1]
+        if self.use_cache:
+            cached = cache.get(key, signature, self.cache_ttl)
+            if cached is not None:
+                output, stored = cached
+                output[0] += f' #Cached results of {datetime.fromtimestamp(stored):%Y-%m-%d %H:%M:%S}'
+                return output
+
+        output, timed_out = self._execute()
+
+        # Partial results are never reused
+        if not timed_out:
+            cache.set(key, signature, output)
 
         return output
 
+    # The output of the command is parsed line by line while it runs, stdout and stderr by their own threads, so only the results are held in memory. Returns the output and whether the command timed out.
+    def _execute(self):
+        stdout_output = []
+        stderr_output = []
+        # Entries read from stdout and stderr
+        entries = [0, 0]
+
+        process = subprocess.Popen(self.source, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors='replace', start_new_session=True)
+
+        readers = [threading.Thread(target=self._read_stream, args=(process.stdout, stdout_output, entries, 0), daemon=True),
+                   threading.Thread(target=self._read_stream, args=(process.stderr, stderr_output, entries, 1), daemon=True)]
+        for reader in readers:
+            reader.start()
+
+        timed_out = False
+        try:
+            process.wait(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            _kill_process_group(process)
+            # The killed shell is waited for, so it does not linger as a zombie
+            try:
+                process.wait(timeout=KILL_GRACE_PERIOD)
+            except subprocess.TimeoutExpired:
+                pass
+
+        # Processes started with more privileges might survive the kill and keep the output open, hence the readers are only waited for a moment
+        for reader in readers:
+            reader.join(KILL_GRACE_PERIOD if timed_out else None)
+
+        output = stdout_output + stderr_output
+        total_entries = entries[0] + entries[1]
+
+        header = self._generate_header(output, total_entries)
+        if timed_out:
+            header += f' #Timed out after {self.timeout:g} seconds, partial results'
+
+        return [header] + output, timed_out
+
+    # The stream is closed by its reader once every process writing to it is gone, closing it from another thread would block until the pending read returns
+    def _read_stream(self, stream, output, entries, index):
+        try:
+            for line in stream:
+                entries[index] += 1
+
+                result = self._parse_entry(line.rstrip('\n'))
+                if result:
+                    output += result
+        finally:
+            stream.close()
+
+# Verifies the installed files of the packages with the metadata of the package manager instead of running it. The verifier writes its findings in the same format as the package manager, so the same rules files apply.
+class PackageVerifierParser(GenericParser):
+    __pretty_name__ = 'Package Verifier'
+    isParallelizable = True
+    isSplittable = False
+
+    def __init__(self, rules_path, scope, verifier, state_path = None):
+        super().__init__(rules_path, scope, verifier, state_path=state_path)
+
+    # The packages are always verified completely
+    def resume(self, checkpoint):
+        self.checkpoint = None
+
+        return self.checkpoint
+
     def parse(self):
         output = []
 
-        checks = self._get_checks()
-        total_entries = len(checks)
+        hash_cache = HashCache(self.state_path, self.source)
+        verifier = VERIFIERS[self.source](hash_cache)
 
-        for line in checks:
-            result = self._parse_entry(line)
-            if result:
-                for item in result:
-                    output.append(item)
-        
+        _drain(self._stream_lines(verifier.verify()), output.extend)
+        hash_cache.save()
+
+        # Every verified file is an entry, not only the findings
         if len(output) > 0:
-            output = [self._generate_header(output, total_entries)] + output
+            output = [self._generate_header(output, verifier.total_files)] + output
         else:
-            output = [self._generate_header(output, total_entries)]
-            
+            output = [self._generate_header(output, verifier.total_files)]
+
         return output
+
+# Kills the shell of a command and every process it started
+def _kill_process_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def _in_window(window, timestamp):
+    since, until = window
+
+    return (since is None or timestamp >= since) and (until is None or timestamp <= until)
+
+# Decodes the lines of a binary file from its current position until the given offset, or until the end of the file if it is None
+def _read_lines(file, end):
+    position = file.tell()
+
+    for line in file:
+        if end is not None and position >= end:
+            break
+        position += len(line)
+
+        # Same newline translation as the text mode
+        if line.endswith(b'\r\n'):
+            line = line[:-2] + b'\n'
+        yield line.decode()
+
+# Passes every batch of a stream to the sink and returns the return value of the stream
+def _drain(batches, sink):
+    while True:
+        try:
+            sink(next(batches))
+        except StopIteration as stop:
+            return stop.value
@@ -0,0 +1,172 @@
+from utils import get_user_name
+import os
+
+# Length at which the kernel truncates the names of the processes
+COMM_LENGTH = 15
+# States in /proc/net of the listening TCP sockets, and of the UDP sockets that are not connected, which are the ones receiving from anyone
+TCP_LISTEN_STATE = '0A'
+UDP_UNCONNECTED_STATE = '07'
+
+# Snapshot of the processes and sockets of the system, read from /proc once per run and shared by the checkers. Only the files holding the requested fields are read, and the owners of the sockets are only looked for when they are asked for. The root can point to a fake /proc tree.
+class ProcSnapshot:
+
+    def __init__(self, root = '/proc'):
+        self.root = root
+        self.processes = {}
+        # inode ==> pid of the process owning the socket, None when no process was found
+        self.socket_owners = {}
+
+    # Returns the info (field ==> value) of every running process, with the fields pid, name, username and cmdline asked for. Fields that can not be read are None, like psutil does.
+    def get_processes(self, fields):
+        processes = []
+
+        for pid in self._get_pids():
+            info = self._get_process(pid, fields)
+            if info is not None:
+                processes.append(info)
+
+        return processes
+
+    def get_process_name(self, pid):
+        info = self._get_process(pid, ['name'])
+
+        return info['name'] if info is not None else None
+
+    # Returns the pid of the process owning the socket of each inode (inode ==> pid), None when it is unknown
+    def get_socket_owners(self, inodes):
+        missing = set(inodes) - self.socket_owners.keys()
+
+        if len(missing) > 0:
+            self.socket_owners.update(self._find_socket_owners(missing))
+
+        return {inode: self.socket_owners[inode] for inode in inodes}
+
+    # Returns (protocol, port, inode) of every listening TCP socket and bound UDP socket, from the tables of /proc/net
+    def get_listening_sockets(self):
+        sockets = []
+
+        for protocol, table, state in (('TCP', 'tcp', TCP_LISTEN_STATE), ('TCP', 'tcp6', TCP_LISTEN_STATE), ('UDP', 'udp', UDP_UNCONNECTED_STATE), ('UDP', 'udp6', UDP_UNCONNECTED_STATE)):
+            try:
+                with open(os.path.join(self.root, 'net', table)) as table_file:
+                    next(table_file, None)
+
+                    for line in table_file:
+                        fields = line.split()
+                        if len(fields) > 9 and fields[3] == state:
+                            port = int(fields[1].rsplit(':', 1)[1], 16)
+                            # Sockets that are not bound have no port
+                            if port != 0:
+                                sockets.append((protocol, port, int(fields[9])))
+            except FileNotFoundError:
+                continue
+
+        return sockets
+
+    def _get_pids(self):
+        return sorted(int(name) for name in os.listdir(self.root) if name.isdigit())
+
+    # The fields of a process are read the first time they are asked for and kept, returns None if the process no longer exists
+    def _get_process(self, pid, fields):
+        info = self.processes.get(pid, None)
+
+        if info is None:
+            info = self.processes[pid] = {}
+
+        try:
+            for field in fields:
+                if field not in info:
+                    info[field] = self._read_field(pid, field, info)
+        except (FileNotFoundError, ProcessLookupError):
+            del self.processes[pid]
+            return None
+
+        return {field: info[field] for field in fields}
+
+    def _read_field(self, pid, field, info):
+        try:
+            if field == 'pid':
+                return pid
+            elif field == 'name':
+                return self._read_name(pid, info)
+            elif field == 'username':
+                return self._read_username(pid)
+            elif field == 'cmdline':
+                return self._read_cmdline(pid)
+        except PermissionError:
+            return None
+
+        return None
+
+    # The name in stat is truncated, like psutil does it is completed with the command line when it is its start
+    def _read_name(self, pid, info):
+        with open(os.path.join(self.root, str(pid), 'stat'), 'rb') as stat_file:
+            stat = stat_file.read()
+
+        name = os.fsdecode(stat[stat.find(b'(') + 1:stat.rfind(b')')])
+
+        if len(name) >= COMM_LENGTH:
+            if 'cmdline' not in info:
+                info['cmdline'] = self._read_field(pid, 'cmdline', info)
+
+            if info['cmdline']:
+                full_name = os.path.basename(info['cmdline'][0])
+                if full_name.startswith(name):
+                    name = full_name
+
+        return name
+
+    # The name of the real user of the process, or its uid if it has no name
+    def _read_username(self, pid):
+        with open(os.path.join(self.root, str(pid), 'status'), 'rb') as status_file:
+            for line in status_file:
+                if line.startswith(b'Uid:'):
+                    return get_user_name(int(line.split()[1]))
+
+        return None
+
+    def _read_cmdline(self, pid):
+        with open(os.path.join(self.root, str(pid), 'cmdline'), 'rb') as cmdline_file:
+            cmdline = os.fsdecode(cmdline_file.read())
+
+        if not cmdline:
+            return []
+
+        # Processes that rewrite their command line may separate the arguments with spaces, they are split like psutil does
+        separator = '\0' if cmdline.endswith('\0') else ' '
+        if cmdline.endswith(separator):
+            cmdline = cmdline[:-1]
+
+        arguments = cmdline.split(separator)
+        if separator == '\0' and len(arguments) == 1 and ' ' in cmdline:
+            arguments = cmdline.split(' ')
+
+        return arguments
+
+    # Map of the inodes to the pid of the first process with their socket open. The descriptors of the processes are read one by one and the search stops as soon as every socket is found, so it does not depend on the amount of files and connections open in the system.
+    def _find_socket_owners(self, inodes):
+        socket_owners = dict.fromkeys(inodes)
+        missing = set(inodes)
+
+        for pid in self._get_pids():
+            try:
+                with os.scandir(os.path.join(self.root, str(pid), 'fd')) as descriptors:
+                    for descriptor in descriptors:
+                        try:
+                            target = os.readlink(descriptor.path)
+                        except OSError:
+                            continue
+
+                        if not target.startswith('socket:['):
+                            continue
+
+                        inode = int(target[8:-1])
+                        if inode in missing:
+                            socket_owners[inode] = pid
+                            missing.remove(inode)
+
+                            if len(missing) == 0:
+                                return socket_owners
+            except OSError:
+                continue
+
+        return socket_owners
@@ -1,5 +1,12 @@
 from datetime import datetime
 from definitions.constants import Constants
+import shutil
+import os
+
+# Reference to a file holding report lines, it is only read when the report is saved so the lines never need to be in memory
+class Spool:
+    def __init__(self, path):
+        self.path = path
 
 class ReportManager:
 
@@ -38,7 +45,11 @@ class ReportManager:
         if report and len(report) > 0:
             with open(filename, 'w') as report_file:
                 for item in report:
-                    if item.startswith('\n'):
+                    if isinstance(item, Spool):
+                        with open(item.path) as spool_file:
+                            shutil.copyfileobj(spool_file, report_file)
+                        os.remove(item.path)
+                    elif item.startswith('\n'):
                         report_file.write(item)
                     else:
                         report_file.write(item + "\n")
@@ -141,5 +152,25 @@ class ReportManager:
                         self.remote_report.append(separator)
                 self.remote_report.append('\n')
 
+    # Same as generate_report for the parsers scopes, but the results are given as spool files instead of as a list
+    def generate_spooled_report(self, header, spools, scope):
+        box_char = '-'
+        delimiter_line = box_char * (len(header) + 2)
+        section = [delimiter_line, '|' + header + '|', delimiter_line]
+
+        for spool in spools:
+            if os.path.getsize(spool) > 0:
+                section.append(Spool(spool))
+            else:
+                os.remove(spool)
+        section.append('\n')
+
+        if scope == Constants.SCOPE.LOG:
+            self.log_report += section
+        elif scope == Constants.SCOPE.CONF:
+            self.conf_report += section
+        elif scope == Constants.SCOPE.PACKAGE:
+            self.binary_report += section
+
     def summary(self):
         pass
\ No newline at end of file
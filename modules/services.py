@@ -1,7 +1,20 @@
 from definitions.constants import Constants
+from modules.units import UnitFileScanner, get_failed_units
+from modules.caches import ContentCache, get_signature
+from concurrent.futures import ThreadPoolExecutor
 import subprocess
+import hashlib
+import json
+import os
 import re
 
+# Amount of units analyzed by each invocation of systemd-analyze
+ANALYSIS_BATCH_SIZE = 32
+# Amount of service analyses kept between runs
+ANALYSIS_CACHE_SIZE = 4096
+# A new version of systemd replaces these, which changes every analysis
+SYSTEMD_BINARIES = ['/usr/lib/systemd/systemd', '/lib/systemd/systemd', '/usr/bin/systemd-analyze', '/bin/systemd-analyze']
+
 class Service:
     def __init__(self, name, state, preset):
         self.name = name
@@ -9,10 +22,7 @@ class Service:
         self.preset = preset
 
     def analyze(self):
-        result = {'Service': self.name}
-        
         exposure = None
-        different_than_preset = None
 
         security_command = f'{Constants.COMMAND.SYSTEMD_SECURITY} {self.name}'
         verification_command = f'{Constants.COMMAND.SYSTEMD_VERIFY} {self.name}'
@@ -24,11 +34,19 @@ class Service:
             exposure = security_output.stdout.split('\n')[-2]
             exposure = exposure.split(':')[-1].split(' ')[1:3]
 
+        return self.get_result(exposure, verification_output.returncode)
+
+    # Builds the result of the service from its exposure (exposure, risk) and the exit code of its verification
+    def get_result(self, exposure, syntax_errors):
+        result = {'Service': self.name}
+
+        different_than_preset = None
+
         if exposure:
             result['Exposure'] = exposure[0]
             result['Risk'] = exposure[1]
 
-        result['SyntaxErrors'] = verification_output.returncode
+        result['SyntaxErrors'] = syntax_errors
  
         if self.state != self.preset:
             different_than_preset = (self.state, self.preset)
@@ -56,36 +74,149 @@ class FailedService:
 
         return result
 
+# The services are enumerated from the unit files by the scanner and the failed ones are given by the provider, a function returning (name, load, active, sub, description) of each of them. Both can be replaced, to analyze another tree of units.
 class ServiceManager:
-    def __init__(self, config):
+    def __init__(self, config, scanner = None, failed_provider = None):
         self.config = config
+        self.scanner = scanner if scanner else UnitFileScanner()
+        self.failed_provider = failed_provider if failed_provider else get_failed_units
         self.services = self.get_services()
         self.services += self.get_failed_services()
 
     def get_services(self):
-        command = Constants.COMMAND.SYSTEMD_UNITS
         services = []
 
-        output = subprocess.run(command, shell=True, capture_output=True, text=True)
-        for entry in output.stdout.split('\n'):
-            match = re.search(Constants.REGEX.SYSTEMD_UNITS_STATUS, entry)
+        for name, state, preset in self.scanner.get_unit_files('.service'):
+            if preset in ('enabled', 'disabled'):
+                services.append(Service(name, state, preset))
 
-            if match:
-                if match[3] in ('enabled', 'disabled'):
-                    services.append(Service(match[1], match[2], match[3]))
-        
         return services
 
-    def get_failed_services(self):
-        command = Constants.COMMAND.SYSTEMD_FAILED
-        services = []
+    def analyze(self):
+        names = [service.name for service in self.services if isinstance(service, Service)]
+        analyses = self._get_cached_analyses(names)
 
-        output = subprocess.run(command, shell=True, capture_output=True, text=True)
-    
-        for entry in output.stdout.split('\n')[1:-6]:
-            match = re.search(Constants.REGEX.SYSTEMD_FAILED_UNITS, entry)
+        results = []
 
-            if match:
-                services.append(FailedService(match[1], match[2], match[3], match[4], match[5]))
-            
-        return services
+        for service in self.services:
+            if isinstance(service, Service):
+                results.append(service.get_result(*analyses[service.name]))
+            else:
+                results.append(service.analyze())
+
+        return results
+
+    # The analysis of a service only changes with its unit file, its drop-ins and the version of systemd, so it is cached under a digest of them and only the services whose digest changed are analyzed again. Without use_cache every service is analyzed but the analyses are still cached.
+    def _get_cached_analyses(self, names):
+        cache = ContentCache(self.config.state_path, 'services', ANALYSIS_CACHE_SIZE)
+        systemd_signature = get_signature(SYSTEMD_BINARIES)
+
+        keys = {name: self._get_analysis_key(name, systemd_signature) for name in names}
+        analyses = {}
+
+        if self.config.use_cache:
+            for name in names:
+                analysis = cache.get(keys[name])
+                if analysis is not None:
+                    analyses[name] = analysis
+
+        missing = [name for name in names if name not in analyses]
+
+        if len(missing) > 0:
+            for name, analysis in self._analyze_services(missing).items():
+                analyses[name] = analysis
+                cache.set(keys[name], analysis)
+
+        cache.save()
+
+        return analyses
+
+    def _get_analysis_key(self, name, systemd_signature):
+        digest = hashlib.sha256(f'{name}\0{systemd_signature}\0'.encode())
+
+        for path in self.scanner.get_unit_sources(name):
+            digest.update(path.encode() + b'\0')
+
+            if os.path.islink(path):
+                digest.update(os.readlink(path).encode() + b'\0')
+
+            try:
+                with open(path, 'rb') as source_file:
+                    digest.update(hashlib.sha256(source_file.read()).digest())
+            except OSError:
+                digest.update(b'\0')
+
+        return digest.hexdigest()
+
+    # Analyzes every service with a few invocations of systemd-analyze instead of two per service, which are run concurrently. Returns [exposure, syntax errors] of every service.
+    def _analyze_services(self, names):
+        batches = [names[index:index + ANALYSIS_BATCH_SIZE] for index in range(0, len(names), ANALYSIS_BATCH_SIZE)]
+
+        with ThreadPoolExecutor(os.cpu_count()) as executor:
+            verifications = executor.map(self._verify_batch, batches)
+
+            # The exposure of every loaded unit is given at once by the systemd versions with json output, the rest of the units are analyzed in batches
+            exposures = self._get_loaded_exposures()
+            missing = [name for name in names if name not in exposures]
+            for batch_exposures in executor.map(self._get_batch_exposures, [missing[index:index + ANALYSIS_BATCH_SIZE] for index in range(0, len(missing), ANALYSIS_BATCH_SIZE)]):
+                exposures.update(batch_exposures)
+
+            syntax_errors = {}
+            for batch_syntax_errors in verifications:
+                syntax_errors.update(batch_syntax_errors)
+
+        return {name: [exposures.get(name, None), syntax_errors[name]] for name in names}
+
+    def _get_loaded_exposures(self):
+        exposures = {}
+
+        output = subprocess.run(Constants.COMMAND.SYSTEMD_SECURITY.split() + ['--json=short', '--no-pager'], capture_output=True, text=True)
+        if output.returncode != 0:
+            return exposures
+
+        try:
+            units = json.loads(output.stdout)
+        except ValueError:
+            return exposures
+
+        for unit in units:
+            if unit.get('exposure', None) is not None and unit.get('predicate', None) is not None:
+                exposures[unit['unit']] = [str(unit['exposure']), unit['predicate']]
+
+        return exposures
+
+    def _get_batch_exposures(self, batch):
+        exposures = {}
+
+        output = subprocess.run(Constants.COMMAND.SYSTEMD_SECURITY.split() + batch, capture_output=True, text=True)
+
+        # Like the analysis of a single unit, a failed one has no exposure
+        if output.returncode != 0 and len(batch) == 1:
+            return exposures
+
+        for match in re.finditer(Constants.REGEX.SYSTEMD_EXPOSURE, output.stdout):
+            exposures[match['Unit']] = [match['Exposure'], match['Risk']]
+
+        # A unit that can not be analyzed might stop the whole invocation, the units left without exposure are analyzed on their own
+        if output.returncode != 0:
+            for name in batch:
+                if name not in exposures:
+                    exposures.update(self._get_batch_exposures([name]))
+
+        return exposures
+
+    # The exit code of the verification of each unit, a batch that fails is split in halves until the units that fail are found
+    def _verify_batch(self, batch):
+        output = subprocess.run(Constants.COMMAND.SYSTEMD_VERIFY.split() + batch, capture_output=True, text=True)
+
+        if output.returncode == 0 or len(batch) == 1:
+            return {name: output.returncode for name in batch}
+
+        half = len(batch) // 2
+        syntax_errors = self._verify_batch(batch[:half])
+        syntax_errors.update(self._verify_batch(batch[half:]))
+
+        return syntax_errors
+
+    def get_failed_services(self):
+        return [FailedService(*unit) for unit in self.failed_provider()]
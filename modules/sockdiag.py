@@ -0,0 +1,74 @@
+import os
+import socket
+import struct
+
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+# States of the sockets asked for: listening TCP sockets, and UDP sockets that are not connected, which are the ones receiving from anyone
+TCP_LISTEN = 10
+UDP_UNCONNECTED = 7
+# Length, type, flags, sequence and port of a netlink message
+NLMSG_HEADER = struct.Struct('=IHHII')
+# Family, protocol, extensions, padding and states of an inet_diag_req_v2, followed by an empty socket id
+INET_DIAG_REQUEST = struct.Struct('=BBBxI48x')
+# Offsets in an inet_diag_msg of the source port (big endian) and of the inode of the socket
+SOURCE_PORT_OFFSET = 4
+INODE_OFFSET = 68
+RECEIVE_SIZE = 1024 ** 2
+
+# Returns (protocol, port, inode) of every listening TCP socket and bound UDP socket, asking the kernel through NETLINK_SOCK_DIAG. Only the sockets in those states are sent by the kernel, so the time does not depend on the amount of connections. Raises OSError if sock_diag is not available.
+def get_listening_sockets():
+    sockets = []
+
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_SOCK_DIAG) as netlink:
+        for protocol, protocol_number, state in (('TCP', socket.IPPROTO_TCP, TCP_LISTEN), ('UDP', socket.IPPROTO_UDP, UDP_UNCONNECTED)):
+            for family in (socket.AF_INET, socket.AF_INET6):
+                for message in _dump(netlink, family, protocol_number, 1 << state):
+                    port, inode = _decode_socket(message)
+                    # Sockets that are not bound have no port
+                    if port != 0:
+                        sockets.append((protocol, port, inode))
+
+    return sockets
+
+# Yields the inet_diag_msg of every socket of the family and protocol in the states
+def _dump(netlink, family, protocol, states):
+    request = INET_DIAG_REQUEST.pack(family, protocol, 0, states)
+    netlink.send(NLMSG_HEADER.pack(NLMSG_HEADER.size + len(request), SOCK_DIAG_BY_FAMILY, NLM_F_REQUEST | NLM_F_DUMP, 1, 0) + request)
+
+    done = False
+
+    while not done:
+        messages, done = _decode_reply(netlink.recv(RECEIVE_SIZE))
+        yield from messages
+
+# Returns the payloads of the netlink messages of a reply, and whether it is the last reply of the dump
+def _decode_reply(data):
+    messages = []
+    offset = 0
+
+    while offset + NLMSG_HEADER.size <= len(data):
+        length, message_type, _, _, _ = NLMSG_HEADER.unpack_from(data, offset)
+
+        if message_type == NLMSG_DONE or length < NLMSG_HEADER.size:
+            return messages, True
+        if message_type == NLMSG_ERROR:
+            error = -struct.unpack_from('=i', data, offset + NLMSG_HEADER.size)[0]
+            raise OSError(error, os.strerror(error))
+
+        messages.append(data[offset + NLMSG_HEADER.size:offset + length])
+
+        # Messages are aligned to 4 bytes
+        offset += (length + 3) & ~3
+
+    return messages, False
+
+# Returns the source port and the inode of the socket of an inet_diag_msg
+def _decode_socket(message):
+    port = int.from_bytes(message[SOURCE_PORT_OFFSET:SOURCE_PORT_OFFSET + 2], 'big')
+
+    return port, struct.unpack_from('=I', message, INODE_OFFSET)[0]
@@ -0,0 +1,243 @@
+from definitions.constants import Constants
+import fnmatch
+import os
+import re
+import subprocess
+
+# Directories where systemd looks for system units, from the highest to the lowest priority, and whether they only hold runtime units
+SYSTEMD_UNIT_PATHS = [
+    ('/etc/systemd/system.control', False),
+    ('/run/systemd/system.control', True),
+    ('/run/systemd/transient', True),
+    ('/run/systemd/generator.early', True),
+    ('/etc/systemd/system', False),
+    ('/etc/systemd/system.attached', False),
+    ('/run/systemd/system', True),
+    ('/run/systemd/system.attached', True),
+    ('/run/systemd/generator', True),
+    ('/usr/local/lib/systemd/system', False),
+    ('/usr/lib/systemd/system', False),
+    ('/lib/systemd/system', False),
+    ('/run/systemd/generator.late', True),
+]
+# Directories whose units are enabled through symlinks
+SYSTEMD_CONFIG_PATHS = ['/etc/systemd/system.control', '/run/systemd/system.control', '/etc/systemd/system', '/etc/systemd/system.attached', '/run/systemd/system', '/run/systemd/system.attached']
+SYSTEMD_GENERATOR_PATHS = ['/run/systemd/generator.early', '/run/systemd/generator', '/run/systemd/generator.late']
+SYSTEMD_TRANSIENT_PATH = '/run/systemd/transient'
+SYSTEMD_PRESET_PATHS = ['/etc/systemd/system-preset', '/run/systemd/system-preset', '/usr/local/lib/systemd/system-preset', '/usr/lib/systemd/system-preset', '/lib/systemd/system-preset']
+# Symlinks in these directories of a unit enable their target
+SYSTEMD_DEPENDENCY_SUFFIXES = ('.wants', '.requires', '.upholds')
+# Unit file states in which the preset of the unit is not shown, like systemctl does
+SYSTEMD_STATES_WITHOUT_PRESET = (Constants.SYSTEMD_UNIT_STATE.ALIAS, Constants.SYSTEMD_UNIT_STATE.STATIC, Constants.SYSTEMD_UNIT_STATE.GENERATED, Constants.SYSTEMD_UNIT_STATE.TRANSIENT)
+
+INSTALL_KEY_REGEX = re.compile(r'^(WantedBy|RequiredBy|UpheldBy|Alias|Also)\s*=\s*\S', re.MULTILINE)
+
+# Computes the state and preset of the unit files like systemctl list-unit-files does, but reading the unit search paths, their symlinks and the preset files directly. Every path is taken relative to the root, so a fake tree of units can be scanned too.
+class UnitFileScanner:
+
+    def __init__(self, root = '/'):
+        self.root = root
+
+    def _get_path(self, path):
+        return os.path.join(self.root, path.lstrip('/'))
+
+    # Returns (name, state, preset) of every unit file with the given suffix, sorted by name. The preset is None when systemctl would not show it.
+    def get_unit_files(self, suffix):
+        unit_files = self._find_unit_files(suffix)
+        enabled = self._find_enabled_units()
+        presets = self._load_presets()
+
+        results = []
+
+        for name in sorted(unit_files):
+            path, runtime = unit_files[name]
+            state = self._get_state(name, path, runtime, enabled)
+
+            preset = None
+            if state not in SYSTEMD_STATES_WITHOUT_PRESET:
+                preset = self._get_preset(name, presets)
+
+            results.append((name, state, preset))
+
+        return results
+
+    # Returns the paths of the files a unit is loaded from, its unit file and the drop-ins of the unit, of its template and of its type in every search path
+    def get_unit_sources(self, name):
+        unit_path = None
+        drop_ins = []
+        drop_in_names = [name + '.d', name[name.rfind('.') + 1:] + '.d']
+
+        template = _get_template(name)
+        if template is not None:
+            drop_in_names.append(template + '.d')
+
+        for directory, _ in SYSTEMD_UNIT_PATHS:
+            directory = self._get_path(directory)
+
+            path = os.path.join(directory, name)
+            if unit_path is None and os.path.lexists(path):
+                unit_path = path
+
+            for drop_in_name in drop_in_names:
+                try:
+                    entries = sorted(os.listdir(os.path.join(directory, drop_in_name)))
+                except (FileNotFoundError, NotADirectoryError, PermissionError):
+                    continue
+
+                drop_ins += [os.path.join(directory, drop_in_name, entry) for entry in entries if entry.endswith('.conf')]
+
+        return ([unit_path] if unit_path else []) + drop_ins
+
+    # name ==> (path, runtime) of the unit file with the highest priority of each name
+    def _find_unit_files(self, suffix):
+        unit_files = {}
+
+        for directory, runtime in SYSTEMD_UNIT_PATHS:
+            try:
+                with os.scandir(self._get_path(directory)) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(suffix) and entry.name not in unit_files and not entry.is_dir():
+                            unit_files[entry.name] = (entry.path, runtime)
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+
+        return unit_files
+
+    # name ==> whether the unit is only enabled at runtime, for every unit targeted by a dependency or alias symlink in the configuration directories. Templates are enabled by the symlinks of any of their instances.
+    def _find_enabled_units(self):
+        enabled = {}
+
+        for directory in SYSTEMD_CONFIG_PATHS:
+            runtime = directory.startswith('/run/')
+            directory = self._get_path(directory)
+
+            try:
+                entries = list(os.scandir(directory))
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+
+            links = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False) and entry.name.endswith(SYSTEMD_DEPENDENCY_SUFFIXES):
+                    try:
+                        links += [link for link in os.scandir(entry.path) if link.is_symlink()]
+                    except PermissionError:
+                        continue
+                # Linked unit files do not enable their unit, unlike aliases
+                elif entry.is_symlink() and os.path.basename(os.readlink(entry.path)) != entry.name:
+                    links.append(entry)
+
+            for link in links:
+                target = os.path.basename(os.readlink(link.path))
+                # Masks are not aliases
+                if target == 'null':
+                    continue
+
+                for name in (target, _get_template(target)):
+                    if name is not None:
+                        enabled[name] = enabled.get(name, True) and runtime
+
+        return enabled
+
+    def _get_state(self, name, path, runtime, enabled):
+        directory = os.path.dirname(path)
+        states = Constants.SYSTEMD_UNIT_STATE
+
+        if os.path.islink(path):
+            target = os.readlink(path)
+
+            if target == '/dev/null':
+                return states.MASKED_RUNTIME if runtime else states.MASKED
+            if os.path.basename(target) != name:
+                return states.ALIAS
+
+        if directory in [self._get_path(generator_path) for generator_path in SYSTEMD_GENERATOR_PATHS]:
+            return states.GENERATED
+        if directory == self._get_path(SYSTEMD_TRANSIENT_PATH):
+            return states.TRANSIENT
+
+        if name in enabled:
+            return states.ENABLED_RUNTIME if enabled[name] else states.ENABLED
+
+        if os.path.islink(path):
+            return states.LINKED_RUNTIME if runtime else states.LINKED
+
+        try:
+            install_keys = self._get_install_keys(path)
+        except OSError:
+            return states.BAD
+
+        if len(install_keys & {'WantedBy', 'RequiredBy', 'UpheldBy', 'Alias'}) > 0:
+            return states.DISABLED
+        elif 'Also' in install_keys:
+            return states.INDIRECT
+        else:
+            return states.STATIC
+
+    # Keys of the [Install] section of a unit file that make it installable
+    def _get_install_keys(self, path):
+        with open(path, errors='replace') as unit_file:
+            content = unit_file.read()
+
+        keys = set()
+        for section in re.split(r'^\[', content, flags=re.MULTILINE):
+            if section.startswith('Install]'):
+                keys |= {match[1] for match in INSTALL_KEY_REGEX.finditer(section)}
+
+        return keys
+
+    # List of (action, pattern) of every preset file, a file in a directory of higher priority hides the files with the same name. The files are applied in the order of their names.
+    def _load_presets(self):
+        preset_files = {}
+
+        for directory in SYSTEMD_PRESET_PATHS:
+            try:
+                with os.scandir(self._get_path(directory)) as entries:
+                    for entry in entries:
+                        if entry.name.endswith('.preset') and entry.name not in preset_files:
+                            preset_files[entry.name] = entry.path
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+
+        presets = []
+
+        for name in sorted(preset_files):
+            try:
+                with open(preset_files[name], errors='replace') as preset_file:
+                    for line in preset_file:
+                        fields = line.split()
+                        if len(fields) >= 2 and fields[0] in ('enable', 'disable', 'ignore'):
+                            presets.append((fields[0], fields[1]))
+            except OSError:
+                continue
+
+        return presets
+
+    # The first preset matching the unit applies, units without any are enabled
+    def _get_preset(self, name, presets):
+        for action, pattern in presets:
+            if fnmatch.fnmatchcase(name, pattern):
+                return {'enable': 'enabled', 'disable': 'disabled', 'ignore': 'ignored'}[action]
+
+        return 'enabled'
+
+# Returns (name, load, active, sub, description) of the failed services. systemd does not keep the failed state of the units in files, hence it is asked to systemctl.
+def get_failed_units():
+    units = []
+
+    output = subprocess.run(Constants.COMMAND.SYSTEMD_FAILED, shell=True, capture_output=True, text=True)
+
+    for line in output.stdout.split('\n'):
+        match = re.search(Constants.REGEX.SYSTEMD_FAILED_UNITS, line)
+
+        if match:
+            units.append((match['Unit'], match['Load'], match['Active'], match['Sub'], match['Description']))
+
+    return units
+
+# Name of the template of an instance, foo@.service for foo@bar.service
+def _get_template(name):
+    if '@' not in name or name.find('@') + 1 == name.rfind('.'):
+        return None
+
+    return name[:name.find('@') + 1] + name[name.rfind('.'):]
@@ -1,6 +1,8 @@
 import sys
 from modules.controller import Controller
+from modules.local import FileChecker
 from utils import fprint as fprint
+from utils import check_state_path
 from config import Config
 import configparser
 try:
@@ -13,10 +15,18 @@ import importlib.util
 #Defaults section
 CONFIG_FILE = None
 
+# The checkpoints and caches are trusted, so nothing is analyzed with a state directory that others could tamper with
+def prepare_state_path():
+    try:
+        check_state_path(Constants.PATH.DEFAULT_STATE_PATH)
+    except OSError as error:
+        fprint(f'The state directory can not be used: {error}. Exitting.')
+        exit()
+
 if __name__ == "__main__":
 
     # Check dependencies
-    required_dependencies = ['nmap', 'distro', 'psutil', 'systemd']
+    required_dependencies = ['nmap', 'distro', 'systemd']
     not_found_dependencies = []
     for dependency in required_dependencies:
         module = importlib.util.find_spec(dependency)
@@ -31,6 +41,10 @@ if __name__ == "__main__":
     unattended = False
     reports_path = None
     use_journal = False
+    full_scan = False
+    use_cache = True
+    paranoid = False
+    baseline_path = None
 
     if distro == 'Ubuntu':
         locations_file = Constants.PATH.UBUNTU_LOCATIONS_PATH
@@ -47,6 +61,10 @@ if __name__ == "__main__":
             print('  -s: defines the scope of the analysis, requires an string separated by comas of the scopes to execute, each scope being a number, for example -s 1,3,5')
             print('  -j: indicates that the journal should be analyzed, it only makes sense if the LOG scope is used and is ignored otherwise')
             print('  -r: defines the path to where the reports will be saved, the path must be a directory and exist, for example -r /home/user/reports/')
+            print('  --full: analyze the logs completely instead of only the entries added since the previous run')
+            print('  --no-cache: execute every command instead of reusing the cached results of the previous runs')
+            print('  --paranoid: hash again a random sample of the files whose digests are cached, in case they were modified keeping their size and times')
+            print('  --generate-baseline: write a filesystem database with the current digest and attributes of every file covered by the current one and exit, requires the path of the new database, for example --generate-baseline /home/user/filesystem.list')
             print('  -h or --help: print this message')
             print('Note: in unattended mode the reports path is not mandatory as by default /tmp will be used, however the scope is.')
             unattended = True
@@ -62,6 +80,22 @@ if __name__ == "__main__":
         if arg == '-j':
             use_journal = True
 
+        if arg == '--full':
+            full_scan = True
+
+        if arg == '--no-cache':
+            use_cache = False
+
+        if arg == '--paranoid':
+            paranoid = True
+
+        if arg == '--generate-baseline':
+            if index + 1 < len(sys.argv):
+                baseline_path = sys.argv[index + 1]
+            else:
+                print("--generate-baseline flag requires a path, i.e: /home/user/filesystem.list")
+            unattended = True
+
         if arg == '-r':
             if index + 1 < len(sys.argv):
                 reports_path = sys.argv[index + 1]
@@ -69,6 +103,12 @@ if __name__ == "__main__":
                 print("-r flag requires a path, i.e: /home/user/reports/")
             unattended = True
 
+    if baseline_path is not None:
+        prepare_state_path()
+        FileChecker(use_cache=use_cache).generate_baseline(baseline_path)
+        fprint(f'Baseline written to {baseline_path}')
+        exit()
+
     if unattended == False:
         print('Define the scope of the analysis by typing the numbers of the desired modules separating them by a space or leave empty for defaults. For example: 1 3 4')
         print('Available scopes: ' + Constants.SCOPE.get_scopes())
@@ -86,11 +126,13 @@ if __name__ == "__main__":
         reports_path = input('Reports path: ')
 
     if scope is not None:
+        prepare_state_path()
+
         if reports_path is None or reports_path == '':
             reports_path = Constants.PATH.DEFAULT_REPORTS_PATH
 
         # Use journal flag to false for debugging purposes
-        config = Config(distro, locations_file, rules_directory = Constants.PATH.RULES_PATH, scope=scope, reports_path=reports_path, use_journal=use_journal)
+        config = Config(distro, locations_file, rules_directory = Constants.PATH.RULES_PATH, scope=scope, reports_path=reports_path, use_journal=use_journal, full_scan=full_scan, use_cache=use_cache, paranoid=paranoid)
 
         controller = Controller(config)
         controller.execute_scope()
@@ -0,0 +1,29 @@
+import os
+import sys
+import pytest
+
+# The modules are imported from the root of the repository, like systell.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Builds a fake file system tree under a temporary directory, the paths are relative to it even when they start with a slash
+class TreeBuilder:
+
+    def __init__(self, root):
+        self.root = str(root)
+
+    def _prepare(self, path):
+        path = os.path.join(self.root, path.lstrip('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        return path
+
+    def write(self, path, content = ''):
+        with open(self._prepare(path), 'wb' if isinstance(content, bytes) else 'w') as file:
+            file.write(content)
+
+    def link(self, path, target):
+        os.symlink(target, self._prepare(path))
+
+@pytest.fixture
+def tree(tmp_path):
+    return TreeBuilder(tmp_path)
@@ -0,0 +1,44 @@
+from modules.databases import load_database, CACHE_VERSION
+import marshal
+import os
+import pytest
+
+DATABASE = '''# Comment
+md5=abc perms=644 path=/etc/passwd
+
+path="/opt/with space/file" owner=root
+  path=/indented
+path="/unterminated quote
+'''
+
+@pytest.fixture
+def database(tree):
+    tree.write('filesystem.list', DATABASE)
+
+    return os.path.join(tree.root, 'filesystem.list')
+
+def _entries(database_path):
+    return [dict(entry.items()) for entry in load_database(database_path)]
+
+def test_entries(database):
+    assert _entries(database) == [
+        {'md5': 'abc', 'perms': '644', 'path': '/etc/passwd'},
+        {'path': '/opt/with space/file', 'owner': 'root'},
+        {'path': '/indented'},
+        {'path': '/unterminated quote'},
+    ]
+
+def test_cache_is_reused(database):
+    entries = _entries(database)
+
+    assert os.path.exists(database + '.cache')
+    assert _entries(database) == entries
+
+@pytest.mark.parametrize('cache', [(CACHE_VERSION - 1, 0, 0), (CACHE_VERSION,), [CACHE_VERSION] * 8, 'not a cache'])
+def test_cache_of_another_layout_is_rebuilt(database, cache):
+    entries = _entries(database)
+
+    with open(database + '.cache', 'wb') as cache_file:
+        marshal.dump(cache, cache_file)
+
+    assert _entries(database) == entries
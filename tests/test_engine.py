@@ -0,0 +1,94 @@
+from modules.engine import RuleEngine, required_literals
+from modules.parsers import GenericParser
+from definitions.constants import Constants
+from entities import Rule
+import glob
+import os
+import pytest
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'definitions', 'rules')
+
+ENTRIES = [
+    '[2023-01-01T10:00:00+0000] [ALPM] running 20-systemd.hook',
+    '[2023-01-01T10:00:00+0000] [PACMAN] error: something bad',
+    '[2023-01-01T10:00:00+0000] [ALPM-SCRIPTLET] x warning: hmm',
+    'warning: linux: /usr/lib/foo (Permissions mismatch)',
+    'warning: linux: /usr/lib/foo (MD5 checksum mismatch)',
+    'linux: 100 total files, 3 altered files',
+    '??5?????? c /etc/foo.conf',
+    '??5?????? /usr/bin/foo',
+    'missing     /usr/bin/x',
+    '2023-01-01 10:00:00 status half-configured foo:amd64 1.0',
+    '2023-01-01 10:00:00 status half-installed foo',
+    'root:x:0:0:root:/root:/bin/bash',
+    'user:x:1000:1000::/home/u:/bin/zsh',
+    'daemon:x:1:1::/:/usr/sbin/nologin',
+    'X11Forwarding yes',
+    '#PrintMotd no',
+    'ENV_PATH PATH=/usr/bin',
+    'FAIL_DELAY 3',
+    'LoadModule proxy_module modules/mod_proxy.so',
+    'linux 6.1-1 -> 6.2-1',
+    'linux/jammy 6.2 amd64 [upgradable from: 6.1]',
+    '2023-01-01 [x] error happened',
+    'Start-Date: 2023-01-01  10:00:00 Commandline: apt install x Requested-By: bob (1000) Install: x End-Date: 2023-01-01  10:00:01',
+    '_TRANSPORT=kernel PRIORITY=0 PRIORITY=1 PRIORITY=2 MESSAGE=boom',
+    '',
+]
+
+# Every escape gives the code point of A, the leftover digits of the escape must never become a literal
+ESCAPED_REGEXES = [r'\x41BC', r'\101BC', r'\u0041BC', r'\U00000041BC', r'\N{LATIN CAPITAL LETTER A}BC', r'(A)\1BC', r'(?P<A>A)(?P=A)?\x42C', r'\0?ABC', r'A\x42\x43']
+
+# Matches an entry rule by rule with a plain re.search, like the parsers did before the rule engine
+def _reference_match(rules, entry):
+    output = []
+
+    for rule in rules:
+        if rule.rule_type != Constants.RULE_TYPE.REGEX and not all(filter in entry for filter in rule.filters):
+            continue
+
+        match = rule.pattern.search(entry)
+        if match:
+            output.append((rule.id, match.groupdict()))
+
+    return output
+
+def _engine_match(engine, entry):
+    return [(rule.id, groupdict) for rule, groupdict in engine.match(entry)]
+
+# Entries holding the literals of every rule, with and without each of them, so the rules are both kept and discarded by the first stage
+def _literal_entries(rules):
+    entries = []
+
+    for rule in rules:
+        literals = list(rule.filters) + (required_literals(rule.regex) if rule.regex else [])
+        entries.append(' '.join(literals))
+        for index in range(len(literals)):
+            entries.append(' '.join(literals[:index] + literals[index + 1:]))
+
+    return entries
+
+@pytest.mark.parametrize('rules_path', sorted(glob.glob(os.path.join(RULES_PATH, '*', '*.ini'))))
+def test_engine_matches_like_re_search(rules_path):
+    rules = GenericParser(rules_path, 'LOG').rules
+    engine = RuleEngine(rules)
+
+    for entry in ENTRIES + _literal_entries(rules):
+        assert _engine_match(engine, entry) == _reference_match(rules, entry), entry
+
+@pytest.mark.parametrize('regex', ESCAPED_REGEXES)
+def test_escapes_are_skipped_whole(regex):
+    assert all('4' not in literal and '1' not in literal and '{' not in literal for literal in required_literals(regex))
+
+    rule = Rule('Escaped', Constants.RULE_TYPE.REGEX, None, None, None, regex)
+    engine = RuleEngine([rule])
+
+    for entry in ['ABC', 'xxABCxx', 'AABC', 'ABD', '41BC', '']:
+        assert _engine_match(engine, entry) == _reference_match([rule], entry), entry
+
+def test_required_literals():
+    assert required_literals(r'\x41BC') == ['BC']
+    assert required_literals(r'status half-configured (?P<Package>.*)') == ['status half-configured ']
+    assert required_literals(r'a\.b\d+c') == ['a.b', 'c']
+    assert required_literals(r'abc?d') == ['ab', 'd']
+    assert required_literals(r'error|warning') == []
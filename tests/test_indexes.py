@@ -0,0 +1,38 @@
+from modules.indexes import TimestampParser, TimestampIndex
+from datetime import datetime
+
+NOW = datetime(2024, 1, 10, 12, 0, 0)
+
+def test_format_with_year():
+    parser = TimestampParser('%Y-%m-%d %H:%M:%S', NOW)
+
+    assert parser.parse('2023-12-31 23:00:00 status installed') == datetime(2023, 12, 31, 23, 0, 0).timestamp()
+    assert parser.parse('status installed') is None
+
+def test_format_without_year_is_parsed_in_the_current_year():
+    parser = TimestampParser('%b %d %H:%M:%S', NOW)
+
+    assert parser.parse('Jan 10 11:00:00 host sshd[1]: Accepted') == datetime(2024, 1, 10, 11, 0, 0).timestamp()
+    # A few hours ahead is taken as clock skew rather than as the previous year
+    assert parser.parse('Jan 10 18:00:00 host sshd[1]: Accepted') == datetime(2024, 1, 10, 18, 0, 0).timestamp()
+
+def test_format_without_year_accepts_leap_days():
+    parser = TimestampParser('%b %d %H:%M:%S', datetime(2024, 3, 1))
+
+    assert parser.parse('Feb 29 10:00:00 host sshd[1]: Accepted') == datetime(2024, 2, 29, 10, 0, 0).timestamp()
+
+def test_format_without_year_in_the_future_is_the_previous_year():
+    parser = TimestampParser('%b %d %H:%M:%S', NOW)
+
+    assert parser.parse('Dec 31 23:00:00 host sshd[1]: Accepted') == datetime(2023, 12, 31, 23, 0, 0).timestamp()
+
+# syslog files written before the new year are narrowed to the lines of the window like the ones with a year
+def test_index_of_file_without_year(tmp_path):
+    path = tmp_path / 'auth.log'
+    lines = [f'Dec {day:02d} 10:00:00 host sshd[1]: line {day}\n' for day in range(20, 32)] + [f'Jan {day:02d} 10:00:00 host sshd[1]: line {day}\n' for day in range(1, 10)]
+    path.write_text(''.join(lines))
+
+    index = TimestampIndex(str(path), TimestampParser('%b %d %H:%M:%S', NOW), str(tmp_path / 'state'))
+    start, end = index.get_range(datetime(2023, 12, 30).timestamp(), None, 0, None)
+
+    assert path.read_bytes()[start:].decode().splitlines()[0] == 'Dec 30 10:00:00 host sshd[1]: line 30'
@@ -0,0 +1,47 @@
+from modules.local import FileChecker, _walk_files
+from modules import local
+from definitions.constants import Constants
+from concurrent.futures import ThreadPoolExecutor
+import os
+import pytest
+
+@pytest.fixture
+def checker(tree, monkeypatch):
+    for index in range(6):
+        tree.write(f'tree/d{index % 3}/e{index % 2}/f{index}', str(index))
+    tree.write('tree/top', 'top')
+    tree.write('known.txt', '')
+
+    database = os.path.join(tree.root, 'filesystem.list')
+    with open(database, 'w') as database_file:
+        database_file.write(f'dir={tree.root}/tree recursive=yes\n')
+        # Already covered by the directory entry
+        database_file.write(f'path={tree.root}/tree/top perms=644\n')
+        database_file.write(f'hashset={tree.root}/known.txt algorithm=md5 acl=whitelist\n')
+
+    monkeypatch.setattr(Constants.PATH.DATABASE, 'FILESYSTEM', database)
+
+    return FileChecker(os.path.join(tree.root, 'state'))
+
+def test_baseline_has_every_file_once(checker, tree):
+    baseline = os.path.join(tree.root, 'baseline.list')
+    checker.generate_baseline(baseline)
+
+    lines = open(baseline).read().splitlines()
+    paths = [line.rsplit('path=', 1)[1] for line in lines if 'path=' in line]
+
+    assert lines[1] == f'hashset={tree.root}/known.txt algorithm=md5 acl=whitelist'
+    assert sorted(paths) == sorted(set(paths))
+    assert len(paths) == 7
+
+def test_walk_reads_ahead_a_bounded_amount_of_directories(tree, monkeypatch):
+    for index in range(40):
+        tree.write(f'tree/d{index % 8}/e{index % 5}/f{index}')
+
+    with ThreadPoolExecutor(4) as walker:
+        expected = list(_walk_files(walker, os.path.join(tree.root, 'tree'), True))
+        monkeypatch.setattr(local, 'WALK_READ_AHEAD', 2)
+        walked = list(_walk_files(walker, os.path.join(tree.root, 'tree'), True))
+
+    assert walked == expected
+    assert len(walked) == 40
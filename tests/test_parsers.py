@@ -0,0 +1,188 @@
+from modules.parsers import GenericParser, JournalLogParser
+from modules import parsers
+from datetime import datetime, timedelta
+import gzip
+import json
+import os
+
+RULES = '''[Installed]
+Type = Filtered
+Filters = status installed
+'''
+
+def _write_log(path, packages, mtime):
+    with open(path, 'a') as log_file:
+        for package in packages:
+            log_file.write(f'2024-01-01 10:00:00 status installed {package}\n')
+            log_file.write('2024-01-01 10:00:00 startup archives unpack\n')
+    os.utime(path, (mtime, mtime))
+
+# Parses the new data of the source since the checkpoint, the checkpoint goes through JSON like when it is persisted
+def _run(tmp_path, source, checkpoint):
+    rules_path = tmp_path / 'rules.ini'
+    rules_path.write_text(RULES)
+
+    parser = GenericParser(str(rules_path), 'LOG', source=source)
+    checkpoint = json.loads(json.dumps(parser.resume(checkpoint)))
+    output = parser.parse()
+
+    return [line for line in output[1:]], checkpoint
+
+def test_glob_is_resumed_from_checkpoint(tmp_path):
+    log = tmp_path / 'd.log'
+    _write_log(log, ['pkg1'], 1000)
+
+    output, checkpoint = _run(tmp_path, str(tmp_path / 'd.log*'), None)
+    assert len(output) == 1
+
+    _write_log(log, ['pkg2'], 1001)
+    output, checkpoint = _run(tmp_path, str(tmp_path / 'd.log*'), checkpoint)
+    assert len(output) == 1 and 'pkg2' in output[0]
+
+    output, checkpoint = _run(tmp_path, str(tmp_path / 'd.log*'), checkpoint)
+    assert output == []
+
+# logrotate with delaycompress renames d.log to d.log.1 and compresses the previous d.log.1 into a new d.log.2.gz, whose data was already parsed
+def test_rotated_and_compressed_files_are_not_parsed_again(tmp_path):
+    source = str(tmp_path / 'd.log*')
+    _write_log(tmp_path / 'd.log.1', ['pkg1', 'pkg2'], 1000)
+    _write_log(tmp_path / 'd.log', ['pkg3'], 1001)
+
+    output, checkpoint = _run(tmp_path, source, None)
+    assert len(output) == 3
+
+    for step in range(2):
+        # The rotation compresses the oldest file into a new one and renames the others
+        with open(tmp_path / 'd.log.1', 'rb') as rotated_file, gzip.open(tmp_path / f'd.log.{step + 2}.gz', 'wb') as compressed_file:
+            compressed_file.write(rotated_file.read())
+        os.utime(tmp_path / f'd.log.{step + 2}.gz', (999 - step, 999 - step))
+        os.remove(tmp_path / 'd.log.1')
+        os.rename(tmp_path / 'd.log', tmp_path / 'd.log.1')
+        _write_log(tmp_path / 'd.log', [f'pkg{step + 4}'], 1002 + step)
+
+        output, checkpoint = _run(tmp_path, source, checkpoint)
+        assert len(output) == 1 and f'pkg{step + 4}' in output[0]
+
+# Data appended to a file before it was rotated and compressed is still parsed
+def test_data_appended_before_compression_is_parsed(tmp_path):
+    source = str(tmp_path / 'd.log*')
+    _write_log(tmp_path / 'd.log.1', ['pkg1'], 1000)
+
+    output, checkpoint = _run(tmp_path, source, None)
+    assert len(output) == 1
+
+    _write_log(tmp_path / 'd.log.1', ['pkg2'], 1000)
+    with open(tmp_path / 'd.log.1', 'rb') as rotated_file, gzip.open(tmp_path / 'd.log.2.gz', 'wb') as compressed_file:
+        compressed_file.write(rotated_file.read())
+    os.remove(tmp_path / 'd.log.1')
+
+    output, checkpoint = _run(tmp_path, source, checkpoint)
+    assert len(output) == 1 and 'pkg2' in output[0]
+
+def test_new_compressed_file_is_parsed_whole(tmp_path):
+    source = str(tmp_path / 'd.log*')
+    _write_log(tmp_path / 'd.log', ['pkg1'], 1000)
+
+    output, checkpoint = _run(tmp_path, source, None)
+
+    with gzip.open(tmp_path / 'd.log.9.gz', 'wb') as compressed_file:
+        compressed_file.write(b'2024-01-01 10:00:00 status installed pkg0\n')
+
+    output, checkpoint = _run(tmp_path, source, checkpoint)
+    assert len(output) == 1 and 'pkg0' in output[0]
+
+JOURNAL_RULES = '''[Kernel]
+Type = Filtered
+Since = -24h
+Filters = _TRANSPORT=kernel
+
+[Warning]
+Type = Regex
+Since = -60m
+Fields = SYSLOG_IDENTIFIER,MESSAGE
+Regex = ^SYSLOG_IDENTIFIER=(?P<Process>systemd)\\nMESSAGE=(?P<Message>.*)
+'''
+
+# Journal reader over a list of entries, with the matching semantics of the journal: matches of the same field are alternatives, of different fields all required, and disjunctions separate alternative sets
+class FakeReader:
+    entries = []
+    readers = []
+
+    def __init__(self):
+        self.terms = [{}]
+        self.start = None
+        self.read = 0
+        FakeReader.readers.append(self)
+
+    def add_match(self, match):
+        field, value = match.split('=', 1)
+        self.terms[-1].setdefault(field, set()).add(value)
+
+    def add_disjunction(self):
+        self.terms.append({})
+
+    def seek_realtime(self, start):
+        self.start = start
+
+    def _matches(self, entry):
+        terms = [term for term in self.terms if len(term) > 0]
+
+        return len(terms) == 0 or any(all(str(entry.get(field, None)) in values for field, values in term.items()) for term in terms)
+
+    def __iter__(self):
+        for entry in FakeReader.entries:
+            if entry['__REALTIME_TIMESTAMP'] >= self.start and self._matches(entry):
+                self.read += 1
+                yield entry
+
+class FakeJournal:
+    Reader = FakeReader
+
+def test_journal_rules_without_matches_get_their_own_reader(tmp_path, monkeypatch):
+    now = datetime.now()
+    FakeReader.entries = [
+        {'__REALTIME_TIMESTAMP': now - timedelta(hours=3), '__CURSOR': 'a', '_TRANSPORT': 'kernel', 'MESSAGE': 'old kernel'},
+        {'__REALTIME_TIMESTAMP': now - timedelta(hours=2), '__CURSOR': 'b', '_TRANSPORT': 'syslog', 'SYSLOG_IDENTIFIER': 'systemd', 'MESSAGE': 'too old'},
+        {'__REALTIME_TIMESTAMP': now - timedelta(minutes=30), '__CURSOR': 'c', '_TRANSPORT': 'kernel', 'SYSLOG_IDENTIFIER': 'systemd', 'MESSAGE': "it's both"},
+        {'__REALTIME_TIMESTAMP': now - timedelta(minutes=20), '__CURSOR': 'd', '_TRANSPORT': 'syslog', 'SYSLOG_IDENTIFIER': 'systemd', 'MESSAGE': 'started'},
+        {'__REALTIME_TIMESTAMP': now - timedelta(minutes=10), '__CURSOR': 'e', '_TRANSPORT': 'syslog', 'SYSLOG_IDENTIFIER': 'cron', 'MESSAGE': 'ignored'},
+    ]
+    FakeReader.readers = []
+    monkeypatch.setattr(parsers, 'journal', FakeJournal, raising=False)
+
+    rules_path = tmp_path / 'journal.ini'
+    rules_path.write_text(JOURNAL_RULES)
+    output = JournalLogParser(str(rules_path), 'LOG').parse()
+
+    assert output[1:] == [
+        "Kernel ==> {'Kernel': 'old kernel'}",
+        "Kernel ==> {'Kernel': \"it's both\"}",
+        "Warning ==> {'Process': 'systemd', 'Message': \"it's both\"}",
+        "Warning ==> {'Process': 'systemd', 'Message': 'started'}",
+    ]
+    assert 'Total entries: 4' in output[0]
+
+    # The rule with matches only reads its own entries, the rule without matches only the ones since its own Since
+    indexed, unindexed = FakeReader.readers
+    assert indexed.read == 2
+    assert unindexed.read == 3
+    assert unindexed.start > now - timedelta(minutes=61)
+
+def test_timed_out_command_is_reaped_and_its_pipes_closed(tmp_path, monkeypatch):
+    processes = []
+    popen = parsers.subprocess.Popen
+
+    def _popen(*args, **kwargs):
+        processes.append(popen(*args, **kwargs))
+        return processes[-1]
+
+    monkeypatch.setattr(parsers.subprocess, 'Popen', _popen)
+
+    rules_path = tmp_path / 'rules.ini'
+    rules_path.write_text(RULES)
+    output = parsers.GenericCommandParser(str(rules_path), 'LOG', source='echo status installed foo; sleep 30', timeout=0.5).parse()
+
+    assert output[1:] == ["Installed ==> {'Installed': 'status installed foo'}"]
+    assert 'Timed out' in output[0]
+    assert processes[0].returncode is not None
+    assert processes[0].stdout.closed and processes[0].stderr.closed
@@ -0,0 +1,83 @@
+from modules.procfs import ProcSnapshot
+from modules.local import PortChecker
+import os
+import pytest
+
+TCP_HEADER = '  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n'
+UDP_HEADER = '  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode ref pointer drops\n'
+
+def _socket_line(local_address, remote_address, state, inode):
+    return f'   0: {local_address} {remote_address} {state} 00000000:00000000 00:00000000 00000000     0        0 {inode} 1 0000000000000000\n'
+
+@pytest.fixture
+def proc(tree):
+    tree.write('1/stat', b'1 (systemd) S 0 1 1 0')
+    tree.write('1/status', 'Name:\tsystemd\nUid:\t0\t0\t0\t0\n')
+    tree.write('1/cmdline', b'/sbin/init\0splash\0')
+    tree.link('1/fd/0', '/dev/null')
+    tree.link('1/fd/3', 'socket:[1001]')
+
+    # The name in stat is truncated to 15 characters and contains spaces and parentheses
+    tree.write('42/stat', b'42 (a (long) name s) S 1 42 42 0')
+    tree.write('42/status', 'Name:\ta (long) name s\nUid:\t4242424\t0\t0\t0\n')
+    tree.write('42/cmdline', b'/opt/a (long) name server\0--flag\0')
+    tree.link('42/fd/5', 'socket:[1002]')
+    tree.link('42/fd/6', 'socket:[1001]')
+
+    tree.write('43/stat', b'43 (kworker/0:1) I 2 0 0 0')
+    tree.write('43/status', 'Name:\tkworker/0:1\nUid:\t0\t0\t0\t0\n')
+    tree.write('43/cmdline', b'')
+
+    # Processes that rewrite their command line may separate the arguments with spaces
+    tree.write('44/stat', b'44 (postgres) S 1 44 44 0')
+    tree.write('44/status', 'Name:\tpostgres\nUid:\t0\t0\t0\t0\n')
+    tree.write('44/cmdline', b'postgres: checkpointer ')
+
+    tree.write('net/tcp', TCP_HEADER + _socket_line('0100007F:0016', '00000000:0000', '0A', 1001) + _socket_line('0100007F:9C40', '0100007F:0016', '01', 1003))
+    tree.write('net/tcp6', TCP_HEADER + _socket_line('00000000000000000000000000000000:1F90', '00000000000000000000000000000000:0000', '0A', 1002))
+    tree.write('net/udp', UDP_HEADER + _socket_line('00000000:0035', '00000000:0000', '07', 1004) + _socket_line('0100007F:A000', '0100007F:0035', '01', 1005) + _socket_line('00000000:0000', '00000000:0000', '07', 1006))
+
+    return tree.root
+
+def test_processes(proc):
+    processes = ProcSnapshot(proc).get_processes(['pid', 'name', 'username', 'cmdline'])
+
+    assert processes == [
+        {'pid': 1, 'name': 'systemd', 'username': 'root', 'cmdline': ['/sbin/init', 'splash']},
+        {'pid': 42, 'name': 'a (long) name server', 'username': '4242424', 'cmdline': ['/opt/a (long) name server', '--flag']},
+        {'pid': 43, 'name': 'kworker/0:1', 'username': 'root', 'cmdline': []},
+        {'pid': 44, 'name': 'postgres', 'username': 'root', 'cmdline': ['postgres:', 'checkpointer']},
+    ]
+
+def test_only_requested_fields_are_read(proc):
+    os.remove(os.path.join(proc, '1', 'cmdline'))
+
+    assert ProcSnapshot(proc).get_processes(['pid', 'name'])[0] == {'pid': 1, 'name': 'systemd'}
+
+def test_vanished_process(proc):
+    snapshot = ProcSnapshot(proc)
+    os.remove(os.path.join(proc, '43', 'stat'))
+
+    assert [info['pid'] for info in snapshot.get_processes(['pid', 'name'])] == [1, 42, 44]
+    assert snapshot.get_process_name(43) is None
+    assert snapshot.get_process_name(1) == 'systemd'
+
+def test_listening_sockets(proc):
+    assert ProcSnapshot(proc).get_listening_sockets() == [('TCP', 22, 1001), ('TCP', 8080, 1002), ('UDP', 53, 1004)]
+
+def test_socket_owners(proc):
+    snapshot = ProcSnapshot(proc)
+
+    # The socket shared by two processes belongs to the first one
+    assert snapshot.get_socket_owners([1001, 1002, 9999]) == {1001: 1, 1002: 42, 9999: None}
+    assert snapshot.get_socket_owners([1002]) == {1002: 42}
+
+def test_port_checker(proc):
+    results = PortChecker(ProcSnapshot(proc), use_netlink=False).analyze()
+
+    assert results == [
+        '#Checker: Port Checker #Open ports: 3',
+        {'Port': 22, 'PID': 1, 'Process': 'systemd', 'Protocol': 'TCP'},
+        {'Port': 8080, 'PID': 42, 'Process': 'a (long) name server', 'Protocol': 'TCP'},
+        {'Port': 53, 'PID': None, 'Process': None, 'Protocol': 'UDP'},
+    ]
@@ -0,0 +1,74 @@
+from modules.sockdiag import get_listening_sockets, _decode_reply, _decode_socket, NLMSG_HEADER, NLMSG_DONE, NLMSG_ERROR, SOCK_DIAG_BY_FAMILY
+import errno
+import socket
+import struct
+import pytest
+
+# Packs an inet_diag_msg of a socket bound to the port, followed by the given attributes
+def _pack_socket(family, state, port, inode, attributes = b''):
+    socket_id = struct.pack('>HH', port, 0) + bytes(32) + struct.pack('=I8x', 0)
+
+    return struct.pack('=BBBB', family, state, 0, 0) + socket_id + struct.pack('=IIIII', 0, 0, 0, 1000, inode) + attributes
+
+def _pack_message(message_type, payload):
+    message = NLMSG_HEADER.pack(NLMSG_HEADER.size + len(payload), message_type, 2, 1, 0) + payload
+
+    # Messages are padded to 4 bytes
+    return message + bytes(-len(message) % 4)
+
+def test_decode_socket():
+    assert _decode_socket(_pack_socket(socket.AF_INET, 10, 22, 12345)) == (22, 12345)
+    assert _decode_socket(_pack_socket(socket.AF_INET6, 10, 65535, 2 ** 32 - 1)) == (65535, 2 ** 32 - 1)
+
+def test_decode_reply():
+    # The attribute of 5 bytes leaves the first message unaligned
+    sockets = [_pack_socket(socket.AF_INET, 10, 22, 100, struct.pack('=HHB', 5, 1, 0)), _pack_socket(socket.AF_INET, 10, 80, 101)]
+    messages, done = _decode_reply(b''.join(_pack_message(SOCK_DIAG_BY_FAMILY, payload) for payload in sockets))
+
+    assert not done
+    assert [_decode_socket(message) for message in messages] == [(22, 100), (80, 101)]
+
+def test_decode_last_reply():
+    data = _pack_message(SOCK_DIAG_BY_FAMILY, _pack_socket(socket.AF_INET6, 7, 53, 102)) + _pack_message(NLMSG_DONE, struct.pack('=i', 0))
+    messages, done = _decode_reply(data)
+
+    assert done
+    assert [_decode_socket(message) for message in messages] == [(53, 102)]
+
+def test_decode_error():
+    with pytest.raises(OSError) as error:
+        _decode_reply(_pack_message(NLMSG_ERROR, struct.pack('=i', -errno.ENOENT) + bytes(NLMSG_HEADER.size)))
+
+    assert error.value.errno == errno.ENOENT
+
+def test_listening_sockets_on_localhost():
+    listeners = []
+
+    for family, kind, address in [(socket.AF_INET, socket.SOCK_STREAM, '127.0.0.1'), (socket.AF_INET6, socket.SOCK_STREAM, '::1'), (socket.AF_INET, socket.SOCK_DGRAM, '127.0.0.1'), (socket.AF_INET6, socket.SOCK_DGRAM, '::1')]:
+        try:
+            listener = socket.socket(family, kind)
+            listener.bind((address, 0))
+        except OSError:
+            continue
+        if kind == socket.SOCK_STREAM:
+            listener.listen()
+        listeners.append(listener)
+
+    # Connected sockets are not listening
+    client = socket.create_connection(listeners[0].getsockname()[:2])
+    client_port = client.getsockname()[1]
+
+    try:
+        sockets = get_listening_sockets()
+    except OSError:
+        pytest.skip('sock_diag is not available')
+    finally:
+        client.close()
+
+    ports = {(protocol, port) for protocol, port, _ in sockets}
+
+    for listener in listeners:
+        assert ('TCP' if listener.type == socket.SOCK_STREAM else 'UDP', listener.getsockname()[1]) in ports
+        listener.close()
+
+    assert ('TCP', client_port) not in ports
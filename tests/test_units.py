@@ -0,0 +1,62 @@
+from modules.units import UnitFileScanner
+import os
+import pytest
+
+INSTALLABLE = '[Unit]\n[Service]\nExecStart=/bin/true\n[Install]\nWantedBy=multi-user.target\n'
+
+@pytest.fixture
+def root(tree):
+    tree.write('/usr/lib/systemd/system/sshd.service', INSTALLABLE)
+    tree.write('/usr/lib/systemd/system/cups.service', INSTALLABLE)
+    tree.write('/usr/lib/systemd/system/static.service', '[Service]\nExecStart=/bin/true\n')
+    tree.write('/usr/lib/systemd/system/indirect.service', '[Install]\nAlso=cups.service\n')
+    tree.write('/usr/lib/systemd/system/masked.service', INSTALLABLE)
+    tree.write('/usr/lib/systemd/system/getty@.service', INSTALLABLE)
+    tree.write('/usr/lib/systemd/system/runtime.service', INSTALLABLE)
+    tree.write('/usr/lib/systemd/system/sshd.socket', INSTALLABLE)
+    tree.write('/lib/systemd/system/old.service', INSTALLABLE)
+    tree.write('/opt/linked.service', INSTALLABLE)
+    tree.link('/etc/systemd/system/linked.service', '/opt/linked.service')
+    tree.link('/etc/systemd/system/masked.service', '/dev/null')
+    tree.link('/etc/systemd/system/multi-user.target.wants/sshd.service', '/usr/lib/systemd/system/sshd.service')
+    tree.link('/etc/systemd/system/getty.target.wants/getty@tty1.service', '/usr/lib/systemd/system/getty@.service')
+    tree.link('/run/systemd/system/multi-user.target.wants/runtime.service', '/usr/lib/systemd/system/runtime.service')
+    tree.link('/etc/systemd/system/dbus-org.example.service', '/usr/lib/systemd/system/cups.service')
+    tree.write('/run/systemd/generator/generated.service', '[Service]\n')
+    tree.write('/run/systemd/transient/transient.service', '[Service]\n')
+    tree.write('/usr/lib/systemd/system-preset/90-default.preset', 'enable sshd.service\ndisable *\n')
+    tree.write('/usr/lib/systemd/system-preset/50-local.preset', 'enable old.service\n')
+    # Hides the preset file with the same name of a lower priority directory
+    tree.write('/etc/systemd/system-preset/50-local.preset', 'disable old.service\n')
+
+    return tree.root
+
+def test_unit_file_states_and_presets(root):
+    assert UnitFileScanner(root).get_unit_files('.service') == [
+        ('cups.service', 'enabled', 'disabled'),
+        ('dbus-org.example.service', 'alias', None),
+        ('generated.service', 'generated', None),
+        ('getty@.service', 'enabled', 'disabled'),
+        ('indirect.service', 'indirect', 'disabled'),
+        ('linked.service', 'linked', 'disabled'),
+        ('masked.service', 'masked', 'disabled'),
+        ('old.service', 'disabled', 'disabled'),
+        ('runtime.service', 'enabled-runtime', 'disabled'),
+        ('sshd.service', 'enabled', 'enabled'),
+        ('static.service', 'static', None),
+        ('transient.service', 'transient', None),
+    ]
+
+def test_only_units_with_the_suffix(root):
+    assert UnitFileScanner(root).get_unit_files('.socket') == [('sshd.socket', 'disabled', 'disabled')]
+
+def test_unit_sources(root, tree):
+    tree.write('/etc/systemd/system/sshd.service.d/override.conf')
+    tree.write('/etc/systemd/system/sshd.service.d/ignored.txt')
+    drop_in = os.path.join(root, 'etc/systemd/system/sshd.service.d')
+
+    assert UnitFileScanner(root).get_unit_sources('sshd.service') == [os.path.join(root, 'usr/lib/systemd/system/sshd.service'), os.path.join(drop_in, 'override.conf')]
+    assert UnitFileScanner(root).get_unit_sources('missing.service') == []
+
+def test_empty_root(tmp_path):
+    assert UnitFileScanner(str(tmp_path)).get_unit_files('.service') == []
@@ -0,0 +1,41 @@
+from utils import atomic_write, check_state_path
+import os
+import pytest
+
+def test_atomic_write_does_not_follow_planted_links(tree):
+    tree.write('victim', 'untouched')
+    tree.link('state/cache.json.tmp', os.path.join(tree.root, 'victim'))
+    path = os.path.join(tree.root, 'state', 'cache.json')
+
+    with atomic_write(path) as file:
+        file.write('{}')
+
+    assert open(path).read() == '{}'
+    assert open(os.path.join(tree.root, 'victim')).read() == 'untouched'
+    assert sorted(os.listdir(os.path.join(tree.root, 'state'))) == ['cache.json', 'cache.json.tmp']
+
+def test_atomic_write_keeps_the_file_when_interrupted(tree):
+    tree.write('state/cache.json', 'previous')
+    path = os.path.join(tree.root, 'state', 'cache.json')
+
+    with pytest.raises(KeyboardInterrupt):
+        with atomic_write(path) as file:
+            file.write('partial')
+            raise KeyboardInterrupt()
+
+    assert open(path).read() == 'previous'
+    assert os.listdir(os.path.join(tree.root, 'state')) == ['cache.json']
+
+def test_state_path_is_created_private(tmp_path):
+    path = str(tmp_path / 'state')
+    check_state_path(path)
+
+    assert os.stat(path).st_mode & 0o777 == 0o700
+
+def test_state_path_writable_by_others_is_refused(tmp_path):
+    path = str(tmp_path / 'state')
+    os.mkdir(path)
+    os.chmod(path, 0o777)
+
+    with pytest.raises(PermissionError):
+        check_state_path(path)
@@ -1,4 +1,22 @@
-from datetime import timedelta
+from datetime import datetime, timedelta
+from functools import lru_cache
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import threading
+import tempfile
+import stat
+import os
+import pwd
+import grp
+import gzip
+import bz2
+import lzma
+try:
+    import zstandard
+except ImportError:
+    # zstd compressed files are only supported when the zstandard module is installed
+    zstandard = None
 
 def time_parser(input):
     time = float(input[1:-1])
@@ -12,6 +30,141 @@ def time_parser(input):
     elif unit == 's':
         return timedelta(seconds=time)
 
+# Parses the Since and Until times of a rule, either relative to now (-24h), absolute or NOW. None means that there is no bound.
+def datetime_parser(input, now):
+    if not input or input == 'NOW':
+        return None
+    elif input[0] == '-':
+        return now - time_parser(input)
+    else:
+        return datetime.strptime(input, '%Y-%m-%d %H:%M:%S')
+
+def size_parser(input):
+    unit = input[-1].upper()
+    if unit == 'K':
+        return int(float(input[:-1]) * 1024)
+    elif unit == 'M':
+        return int(float(input[:-1]) * 1024 ** 2)
+    elif unit == 'G':
+        return int(float(input[:-1]) * 1024 ** 3)
+    else:
+        return int(input)
+
         
+def is_compressed(path):
+    return path.endswith(('.gz', '.bz2', '.xz', '.zst'))
+
+def can_open(path):
+    return not path.endswith('.zst') or zstandard is not None
+
+def is_glob(path):
+    return any(char in path for char in '*?[')
+
+# Amount of bytes at the start of a file used to recognize it across runs, by the checkpoints and the timestamp indexes
+FINGERPRINT_SIZE = 1024
+
+# Fingerprint of the first length bytes of a file, given its head
+def get_fingerprint(head, length):
+    return hashlib.sha256(head[:length]).hexdigest()
+
+# Opens a file for binary reading, decompressing it on the fly if needed
+def open_binary(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    elif path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    elif path.endswith('.xz'):
+        return lzma.open(path, 'rb')
+    elif path.endswith('.zst'):
+        return zstandard.open(path, 'rb')
+    else:
+        return open(path, 'rb')
+
+# Amount of items handed over to the threads of check_parallel at once, so the pending work never holds every item
+PARALLEL_BATCH_SIZE = 4096
+
+# Yields the result of the worker for every item, in order. The items are processed by a pool of threads, which use every core when the work releases the interpreter lock like reading and hashing files do, and they are taken in batches so they never need to be held in memory all at once.
+def check_parallel(items, worker):
+    with ThreadPoolExecutor(os.cpu_count()) as executor:
+        batch = []
+
+        for item in items:
+            batch.append(item)
+            if len(batch) >= PARALLEL_BATCH_SIZE:
+                yield from executor.map(worker, batch)
+                batch = []
+
+        yield from executor.map(worker, batch)
+
+# Files are hashed with reads of this size into a buffer reused by each thread
+HASH_BUFFER_SIZE = 1024 ** 2
+_hash_buffers = threading.local()
+
+# Returns the hex digest of a file with the given hashlib algorithm
+def hash_file(path, algorithm):
+    return hash_file_digests(path, [algorithm])[algorithm]
+
+# Returns algorithm ==> hex digest of a file, hashing it with every given hashlib algorithm in a single read
+def hash_file_digests(path, algorithms):
+    buffer = getattr(_hash_buffers, 'buffer', None)
+    if buffer is None:
+        buffer = _hash_buffers.buffer = bytearray(HASH_BUFFER_SIZE)
+    view = memoryview(buffer)
+
+    digests = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+    with open(path, 'rb', buffering=0) as file:
+        # The whole file is read once from start to end, the kernel can read ahead further
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        while size := file.readinto(buffer):
+            for digest in digests.values():
+                digest.update(view[:size])
+
+    return {algorithm: digest.hexdigest() for algorithm, digest in digests.items()}
+
+# The names of the users and groups are looked up once per id, ids without a name are given as numbers
+@lru_cache(maxsize=None)
+def get_user_name(uid):
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except KeyError:
+        return str(uid)
+
+@lru_cache(maxsize=None)
+def get_group_name(gid):
+    try:
+        return grp.getgrgid(gid).gr_name
+    except KeyError:
+        return str(gid)
+
 def fprint(text):
-    print('\033[38;2;{};{};{}m{} \033[38;2;255;255;255m'.format(100,100,100, text))
\ No newline at end of file
+    print('\033[38;2;{};{};{}m{} \033[38;2;255;255;255m'.format(100,100,100, text))
+
+# Opens a file to be written through a temporary file next to it, which only replaces the file once it is completely written, so an interrupted run never leaves a corrupted file behind. The temporary file gets a unique name and is created exclusively, so a file or link planted next to the file is never written through. The directory of the file is created if needed, only accessible by the current user.
+@contextmanager
+def atomic_write(path, mode = 'w'):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    descriptor, temporary_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', dir=directory)
+
+    try:
+        with open(descriptor, mode) as file:
+            yield file
+        os.replace(temporary_path, path)
+    except BaseException:
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+        raise
+
+# Creates the directory keeping the state between runs, only accessible by the current user. The checkpoints and caches in it are trusted, so a directory owned by someone else or writable by others is refused, since it could have been planted to forge them.
+def check_state_path(path):
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    stats = os.stat(path)
+
+    if stats.st_uid != os.geteuid():
+        raise PermissionError(f'The state directory {path} is not owned by the current user')
+    if stats.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f'The state directory {path} is writable by other users')